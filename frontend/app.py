@@ -1,10 +1,16 @@
 import streamlit as st
 from streamlit_folium import folium_static
 import folium
-from backend_bridge import handle_user_query, guess_location, get_coords
+from backend_bridge import handle_user_query, guess_location, get_coords, start_flood_tiles
+from src import tracing  # importable once backend_bridge has put the repo root on sys.path
 
 st.set_page_config(page_title="Senior Design MVP", layout="wide")
 
+@st.cache_resource
+def flood_tiles():
+    # one tile server per Streamlit process, shared by every rerun and session
+    return start_flood_tiles()
+
 st.title("Disaster Routing Assistant (MVP)")
 
 st.write(
@@ -60,6 +66,21 @@ if st.button("Run query"):
 
                     m = folium.Map(location=[user_lat, user_lon], zoom_start=13)
 
+                    # flood zones as pre-rendered tiles: the browser only fetches the visible ones
+                    tiles = flood_tiles()
+                    if tiles:
+                        tile_url, tile_index = tiles
+                        folium.TileLayer(
+                            tiles=tile_url,
+                            attr="FEMA flood zones",
+                            name="Flood risk",
+                            overlay=True,
+                            control=True,
+                            opacity=0.8,
+                            min_zoom=tile_index["min_zoom"],
+                            max_native_zoom=tile_index["max_zoom"],
+                        ).add_to(m)
+
                     folium.Marker(
                         [user_lat, user_lon],
                         popup="Your Location",
@@ -99,10 +120,18 @@ if st.button("Run query"):
                                 opacity=0.7,
                             ).add_to(m)
 
+                    if tiles:
+                        folium.LayerControl().add_to(m)
+                        st.caption("Flood risk overlay: red = high, orange = moderate, blue = low risk zones.")
                     folium_static(m, width=1300, height=800)
 
                 with st.expander("Technical Details"):
                     st.json(result["raw_data"])
+
+                    if result.get("trace"):
+                        st.write("**Timing trace**")
+                        st.code(tracing.format_tree(result["trace"]))
+                        st.json(result["trace"], expanded=False)
         else:
             st.subheader("Backend response")
             st.write(result)
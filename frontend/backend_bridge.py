@@ -1,16 +1,17 @@
 import os
 import sys
+import json
 from typing import Dict, Any
 import geocoder
 from geopy.geocoders import Nominatim
-import copy
 
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from src.orchestration.orchestration import main as orchestration_main
-from src.response_agent.response_agent import generate_response
+from src.orchestration.orchestration import DATA_PATH, answer as orchestration_answer
+from src.response_agent.response_agent import generate_response, llm_context
+from src import tracing
 
 def guess_location():
     """Guesses user coords using their IP address and matches it to a location name"""
@@ -39,41 +40,53 @@ def get_coords(name="Storrs, CT"):
         return
     return(loc.latitude,loc.longitude)
 
+def start_flood_tiles(base_path=DATA_PATH):
+    """
+    Start a local server for the pre-rendered flood-zone tiles
+    (src/data_agent/flood_tiles.py). Returns (tile URL template, tile index),
+    or None when the tiles have not been built.
+    """
+    from src.data_agent.flood_tiles import INDEX_FILE, find_flood_tiles, serve_tiles
+
+    tile_dir = find_flood_tiles(base_path)
+    if not tile_dir:
+        return None
+    with open(os.path.join(tile_dir, INDEX_FILE)) as f:
+        index = json.load(f)
+    _, url = serve_tiles(tile_dir)
+    return url + "/{z}/{x}/{y}.png", index
+
 def handle_user_query(query: str, lat=None, lon=None, state="CT"):
     """
     Wrapper that calls orchestration and generates natural language response.
     
-    NOTE: lat/lon parameters are currently ignored because orchestration.main()
-    has hardcoded coordinates. Once orchestration is updated to accept location
-    parameters, this function will pass them through.
-    
     Args:
         query: User's question
-        lat: Latitude (currently not used - waiting for orchestration update)
-        lon: Longitude (currently not used - waiting for orchestration update)
-        state: State abbreviation (defaults to CT)
+        lat: Latitude of the user's start location
+        lon: Longitude of the user's start location
+        state: Not used; see orchestration.state_filter()
     
     Returns:
-        Dict with query, natural language response, and raw data
+        Dict with query, natural language response, raw data and the
+        per-stage timing trace (see src/tracing.py)
     """
+    with tracing.trace("handle_user_query", query=query) as t:
+        result = _run_query(query, lat, lon)
+    result["trace"] = t.to_dict()
+    return result
+
+def _run_query(query, lat, lon):
     try:
-        # TODO: Pass lat/lon once orchestration.main() accepts them
-        # For now, orchestration uses hardcoded coordinates (41.2940, -72.3768)
-        context = orchestration_main(query, lat, lon)
+        # Collect shelter/route data for (lat, lon) and generate the natural language response
+        # (path_coordinates are removed ONLY from the LLM's copy)
+        # Both steps are cached per geohash cell, see src/cache.py
+        context, response_text = orchestration_answer(
+            query, lat, lon, lambda q, c: generate_response(q, llm_context(c))
+        )
         
         if not context:
             return {"error": "No context returned from orchestration", "query": query}
         
-        # Generate natural language response
-        llm_context = copy.deepcopy(context)
-
-        # Remove path_coordinates ONLY from llm_context
-        if "shelters" in llm_context:
-            for shelter in llm_context["shelters"]:
-                if shelter.get("route") and "path_coordinates" in shelter["route"]:
-                    del shelter["route"]["path_coordinates"]
-        response_text = generate_response(query, llm_context)
-        
         # Return both for flexibility
         return {
             "query": query,
@@ -1,25 +1,72 @@
 import sys
-from src.orchestration import orchestration
-from src.response_agent.response_agent import generate_response
+import json
+import argparse
 
-if __name__=="__main__":
-    #default query
-    query="What are the routes to the closest disaster shelters?"
-    
-    # allow user to pass query from terminal
-    if len(sys.argv) == 2:
-        query = sys.argv[1]
+DEFAULT_QUERY = "What are the routes to the closest disaster shelters?"
+DEFAULT_LAT, DEFAULT_LON = 41.2940, -72.3768
+
+def print_answer(context, output):
+    print(json.dumps(context, indent=2))
+    print("\n===== RESPONSE AGENT OUTPUT =====\n")
+    print(output)
+
+def run_local(query, lat, lon):
+    # heavy modules are imported here, not at startup (--client never needs them)
+    from src.orchestration import orchestration
+    from src.response_agent.response_agent import generate_response, llm_context
 
     # 1. run orchestration (collects shelter and routing data)
     # NOTE: orchestration.main() already prints context, so this keeps existing behavior
-    context = orchestration.main(query)
+    context = orchestration.main(query, lat, lon)
 
     if not context:
         print("No context returned from orchestration.")
-        sys.exit(1)
+        return 1
 
     # 2. run the response agent to summarize the context
-    output = generate_response(query, context)
+    output = generate_response(query, llm_context(context))
 
     print("\n===== RESPONSE AGENT OUTPUT =====\n")
     print(output)
+    return 0
+
+def run_client(query, lat, lon, socket_path):
+    from src import worker
+
+    try:
+        reply = worker.ask(query, lat, lon, socket_path)
+    except OSError as e:
+        print(f"No worker on {socket_path} ({e}); answering in this process instead.")
+        print("Start one with: python main.py --serve\n")
+        return run_local(query, lat, lon)
+
+    if "error" in reply:
+        print(reply["error"])
+        return 1
+    print_answer(reply["context"], reply["response"])
+    return 0
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Ask the disaster shelter assistant a question.")
+    parser.add_argument("query", nargs="?", default=DEFAULT_QUERY)
+    parser.add_argument("--lat", type=float, default=DEFAULT_LAT)
+    parser.add_argument("--lon", type=float, default=DEFAULT_LON)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--serve", action="store_true", help="run a resident worker that keeps data and model warm")
+    mode.add_argument("--client", action="store_true", help="send the query to a running --serve worker")
+    mode.add_argument("--importtime", action="store_true", help="report how long the CLI's imports take")
+    parser.add_argument("--socket", help="worker socket path (default: $SDP_SOCKET or a per-user temp file)")
+    args = parser.parse_args()
+
+    if args.importtime:
+        from src.benchmark import importtime
+        sys.exit(importtime.main([]))
+
+    from src import worker
+    socket_path = args.socket or worker.DEFAULT_SOCKET
+    if args.serve:
+        worker.serve(socket_path)
+    elif args.client:
+        sys.exit(run_client(args.query, args.lat, args.lon, socket_path))
+    else:
+        sys.exit(run_local(args.query, args.lat, args.lon))
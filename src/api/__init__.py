@@ -0,0 +1 @@
+#api package init
\ No newline at end of file
@@ -0,0 +1,336 @@
+"""
+Long-lived async HTTP API in front of the orchestration pipeline.
+
+Unlike main.py (one query per process) and the Streamlit bridge (in the UI
+process), the service loads DataAgent once and keeps the OSRM session and
+the Ollama client warm across requests.
+
+    python -m src.api.server --port 8080
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    GET  /metrics
+    POST /shelters  {"lat", "lon", "limit"?, "state"?, "filters"?}
+    POST /routes    {"lat", "lon", "limit"?, "state"?, "filters"?}
+    POST /answer    {"query", "lat", "lon"}
+
+Blocking work runs in two bounded thread pools: one for CPU-bound shelter
+search and one for I/O-bound OSRM/LLM calls. At most max_inflight requests
+run at once and max_queue more may wait; beyond that the service answers
+503 straight away. A malformed payload gets 400 before any work starts;
+an error inside the pipeline is a 500. A request that exceeds its timeout
+gets 504, and its slot is only released once the abandoned work really
+finishes, so slow backends cannot pile up unbounded work behind the pools.
+Add ?trace=1 to a request to get its timing trace (see src/tracing.py) in
+the response.
+/answer results are shared per geohash cell through src/cache.py.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import contextvars
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+
+from .. import tracing
+from ..cache import RESULT_CACHE
+from ..benchmark.stats import summarize_latencies
+from ..data_agent.data_agent import DataAgent
+from ..data_agent.filters import filter_mask
+from .. import routing_agent
+from ..routing_agent import RoutingAgent
+from ..orchestration import orchestration
+from ..response_agent.response_agent import generate_response, llm_context
+
+_dumps = partial(json.dumps, default=str)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Ticket:
+    """Per-request deadline, plus the executor work still running if it timed out."""
+
+    __slots__ = ("deadline", "pending")
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.pending = None
+
+
+class Service:
+    """Warm pipeline state plus the executors and limits the handlers share."""
+
+    def __init__(self, data_path=None, agent=None, cpu_workers=4, io_workers=16,
+                 max_inflight=32, max_queue=128, timeout_s=60.0):
+        self.agent = agent or DataAgent(base_path=data_path or orchestration.DATA_PATH)
+        self.cpu_pool = ThreadPoolExecutor(cpu_workers, thread_name_prefix="api-cpu")
+        self.io_pool = ThreadPoolExecutor(io_workers, thread_name_prefix="api-io")
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+
+        self._slots = None          # created on the serving event loop
+        self.inflight = 0
+        self.waiting = 0
+        self.counts = {}
+        self.latencies = {}
+        self.started = time.time()
+
+    # ---------------------------------------------------------
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        if self.inflight >= self.max_inflight and self.waiting >= self.max_queue:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+
+    def _release(self, *_):
+        self.inflight -= 1
+        self._slots.release()
+
+    async def run(self, ticket, pool, fn, *args):
+        """Run fn in pool; raise TimeoutError past the ticket's deadline."""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        future = loop.run_in_executor(pool, partial(ctx.run, fn, *args))
+        remaining = ticket.deadline - loop.time()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(remaining, 0))
+        except asyncio.TimeoutError:
+            # the thread cannot be interrupted; keep the request's slot until it ends
+            ticket.pending = future
+            raise
+
+    def record(self, endpoint, status, seconds):
+        key = f"{endpoint} {status}"
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.latencies.setdefault(endpoint, deque(maxlen=2000)).append(seconds)
+
+    def metrics(self):
+        data = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "responses": self.counts,
+            "latency": {ep: summarize_latencies(list(v)) for ep, v in self.latencies.items()},
+            "cache": RESULT_CACHE.stats(),
+            "osrm": routing_agent.client().stats(),
+        }
+        if self.agent.partitions is not None:
+            data["tiles"] = self.agent.partitions.stats()
+        return data
+
+    # ---------------------------------------------------------
+    # blocking pipeline steps (run inside the pools)
+    def shelters(self, lat, lon, limit, state, filters=None):
+        return self.agent.get_nearest_shelters(lat, lon, limit=limit, state_filter=state, filters=filters)
+
+    def routes(self, lat, lon, shelter_data, limit):
+        shelters = {s["name"]: [s["lat"], s["lon"]] for s in shelter_data["nearest_shelters"]}
+        result = RoutingAgent.get_routes(lat, lon, shelters, max_results=limit)
+        orchestration.annotate_flood_exposure(self.agent, result["routes"])
+        return result
+
+    def answer(self, query, lat, lon):
+        context, response = orchestration.answer(
+            query, lat, lon, lambda q, c: generate_response(q, llm_context(c)), agent=self.agent
+        )
+        if not context:
+            return {"query": query, "error": "No context returned from orchestration"}
+        return {"query": query, "response": response, "raw_data": context}
+
+
+# -------------------------------------------------------------
+def _handler(endpoint, parse, pipeline):
+    """
+    Wrap a pipeline coroutine with validation, admission control, timeout,
+    tracing and metrics. Only errors from parse(payload) are the client's
+    (400); anything raised inside the pipeline is a 500.
+    """
+
+    async def handle(request):
+        service = request.app["service"]
+        start = time.perf_counter()
+        status = 200
+        try:
+            payload = await request.json() if request.can_read_body else {}
+        except ValueError:      # invalid JSON, or a body that is not UTF-8
+            payload = None
+        if not isinstance(payload, dict):
+            service.record(endpoint, 400, time.perf_counter() - start)
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+        try:
+            args = parse(payload)
+        except KeyError as e:
+            service.record(endpoint, 400, time.perf_counter() - start)
+            return web.json_response({"error": f"bad request: missing field {e}"}, status=400)
+        except (TypeError, ValueError) as e:
+            service.record(endpoint, 400, time.perf_counter() - start)
+            return web.json_response({"error": f"bad request: {e}"}, status=400)
+
+        try:
+            await service._acquire()
+        except Overloaded:
+            service.record(endpoint, 503, time.perf_counter() - start)
+            return web.json_response(
+                {"error": "overloaded, retry later"}, status=503, headers={"Retry-After": "1"}
+            )
+
+        ticket = Ticket(asyncio.get_running_loop().time() + service.timeout_s)
+        want_trace = request.query.get("trace") == "1"
+        try:
+            with tracing.trace(endpoint) if want_trace else tracing.NOOP as t:
+                body = await pipeline(service, args, ticket)
+            if want_trace:
+                body["trace"] = t.to_dict()
+        except asyncio.TimeoutError:
+            status, body = 504, {"error": f"timed out after {service.timeout_s} s"}
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        finally:
+            if ticket.pending is not None and not ticket.pending.done():
+                ticket.pending.add_done_callback(service._release)
+            else:
+                service._release()
+
+        service.record(endpoint, status, time.perf_counter() - start)
+        return web.json_response(body, status=status, dumps=_dumps)
+
+    return handle
+
+
+def parse_location(p):
+    """(lat, lon) of a request payload; raises KeyError/TypeError/ValueError."""
+    lat, lon = float(p["lat"]), float(p["lon"])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"lat/lon out of range: {lat}, {lon}")
+    return lat, lon
+
+
+def _parse_search(p):
+    lat, lon = parse_location(p)
+    limit = int(p.get("limit", 5))
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    state, filters = p.get("state"), p.get("filters")
+    if state is not None and not isinstance(state, str):
+        raise TypeError("state must be a string")
+    if filters is not None and not isinstance(filters, (str, list)):
+        raise TypeError("filters must be a list of filter names")
+    filter_mask(filters)        # unknown filter names raise ValueError
+    return {"lat": lat, "lon": lon, "limit": limit, "state": state, "filters": filters}
+
+
+def _parse_answer(p):
+    lat, lon = parse_location(p)
+    query = p["query"]
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("query must be a non-empty string")
+    return {"query": query, "lat": lat, "lon": lon}
+
+
+async def _shelters(service, a, ticket):
+    return await service.run(
+        ticket, service.cpu_pool, service.shelters, a["lat"], a["lon"], a["limit"], a["state"], a["filters"]
+    )
+
+
+async def _routes(service, a, ticket):
+    shelter_data = await _shelters(service, a, ticket)
+    return await service.run(ticket, service.io_pool, service.routes, a["lat"], a["lon"], shelter_data, a["limit"])
+
+
+async def _answer(service, a, ticket):
+    return await service.run(ticket, service.io_pool, service.answer, a["query"], a["lat"], a["lon"])
+
+
+async def _health(request):
+    return web.json_response({"status": "ok"})
+
+
+async def _metrics(request):
+    return web.json_response(request.app["service"].metrics(), dumps=_dumps)
+
+
+def make_app(service):
+    app = web.Application(client_max_size=64 * 1024)
+    app["service"] = service
+    app.router.add_get("/health", _health)
+    app.router.add_get("/metrics", _metrics)
+    app.router.add_post("/shelters", _handler("shelters", _parse_search, _shelters))
+    app.router.add_post("/routes", _handler("routes", _parse_search, _routes))
+    app.router.add_post("/answer", _handler("answer", _parse_answer, _answer))
+    return app
+
+
+def start_background(service, host="127.0.0.1", port=0):
+    """
+    Serve on a private event loop in a daemon thread (for benchmarks/tests).
+    Returns (base_url, stop) where stop() shuts the server down.
+    """
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    async def start():
+        runner = web.AppRunner(make_app(service))
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        state["runner"] = runner
+        state["port"] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(state["runner"].cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return f"http://{host}:{state['port']}", stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Async HTTP API for the shelter pipeline.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-path", default=orchestration.DATA_PATH)
+    parser.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--io-workers", type=int, default=16)
+    parser.add_argument("--max-inflight", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    args = parser.parse_args(argv)
+
+    service = Service(
+        data_path=args.data_path,
+        cpu_workers=args.cpu_workers,
+        io_workers=args.io_workers,
+        max_inflight=args.max_inflight,
+        max_queue=args.max_queue,
+        timeout_s=args.timeout,
+    )
+    web.run_app(make_app(service), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+#benchmark package init
\ No newline at end of file
@@ -0,0 +1,408 @@
+"""
+Performance benchmarks for the shelter pipeline.
+
+Runs every stage against synthetic data and local stub backends (see
+stubs.py), so numbers are reproducible and need no network, OSRM or Ollama:
+
+    python -m src.benchmark.bench --scale ct --out bench_results.json
+    python -m src.benchmark.bench --scale national --baseline bench_baseline.json
+
+Each operation reports p50/p95/p99 latency, throughput and peak traced
+memory. Results can be saved as a baseline and later runs compared to it.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from . import stubs
+from . import synthetic
+from .stats import summarize_latencies
+
+QUERIES = [
+    "Where are the nearest disaster shelters?",
+    "How do I get to the closest flood shelter?",
+    "What are the routes to the closest disaster shelters?",
+    "Is there a shelter near me that is open?",
+]
+
+ALL_OPS = [
+    "data_agent_load",
+    "nearest_shelters",
+    "nearest_shelters_filtered",
+    "partitioned_load",
+    "nearest_shelters_partitioned",
+    "assign_evacuees",
+    "get_routes",
+    "get_routes_degraded",
+    "interpret_query",
+    "generate_response",
+    "orchestration_main",
+    "service",
+    "service_cached",
+]
+
+# metrics compared against a baseline, and whether bigger is worse
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_per_s": False,
+    "peak_mem_mb": True,
+}
+
+
+# -------------------------------------------------------------
+def time_calls(fn, calls):
+    """Run fn(*args) for each args tuple; returns (latencies, wall seconds)."""
+    latencies = []
+    start = time.perf_counter()
+    for args in calls:
+        t0 = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def peak_memory_mb(fn, args):
+    """Peak Python-traced memory of a single call, in MB."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2**20, 3)
+
+
+def measure(fn, calls, warmup=1):
+    for args in calls[:warmup]:
+        fn(*args)
+    latencies, wall = time_calls(fn, calls)
+    result = summarize_latencies(latencies, wall)
+    result["peak_mem_mb"] = peak_memory_mb(fn, calls[0])
+    return result
+
+
+def measure_concurrent(fn, calls, concurrency):
+    """Latency and throughput of calls issued from `concurrency` client threads."""
+    def timed(args):
+        t0 = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, calls))
+    result = summarize_latencies(latencies, time.perf_counter() - start)
+    result["peak_mem_mb"] = None
+    result["concurrency"] = concurrency
+    return result
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as resp:
+        return json.loads(resp.read())
+
+
+# -------------------------------------------------------------
+def ensure_dataset(scale, data_dir, seed=0):
+    meta_path = os.path.join(data_dir, "dataset.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("scale") == scale and meta.get("seed") == seed:
+            return meta
+
+    print(f"Generating {scale} dataset in {data_dir} ...")
+    shutil.rmtree(os.path.join(data_dir, "bench_partitions"), ignore_errors=True)
+    return synthetic.generate(scale, data_dir, seed=seed)
+
+
+def run_benchmarks(scale, data_dir, ops=None, queries=50, load_repeats=3,
+                   main_runs=10, llm_delay_ms=0.0, osrm_delay_ms=0.0, seed=0,
+                   assignment_origins=100_000, concurrency=16, degraded_delay_ms=500.0):
+    """Run the selected operations and return the report dict."""
+    ops = ops or ALL_OPS
+    dataset = ensure_dataset(scale, data_dir, seed=seed)
+    points = synthetic.query_points(scale, queries, seed=seed + 1)
+
+    with ExitStack() as stack:
+        osrm_url = stack.enter_context(stubs.running(stubs.osrm_stub(osrm_delay_ms / 1000)))
+        ollama_url = stack.enter_context(stubs.running(stubs.ollama_stub(llm_delay_ms / 1000)))
+
+        # ollama builds its default client from OLLAMA_HOST at import time,
+        # so point it at the stub before the pipeline modules are imported
+        os.environ["OLLAMA_HOST"] = ollama_url
+        os.environ["SHELTER_DATA_PATH"] = data_dir
+
+        from .. import routing_agent
+        from ..routing_agent import RoutingAgent
+        from ..data_agent.data_agent import DataAgent
+        from ..data_agent import partitions
+        from ..data_agent.assignment import assign_evacuees
+        from ..orchestration import orchestration
+        from ..response_agent.response_agent import generate_response
+        from ..cache import RESULT_CACHE
+
+        # the per-stage numbers measure uncached work; service_cached turns the caches on
+        RESULT_CACHE.enabled = orchestration.INTENT_CACHE.enabled = False
+        routing_agent.OSRM_URLS = [osrm_url]
+        orchestration.DATA_PATH = data_dir
+        if scale != "ct":
+            orchestration.STATE_FILTER = ""
+
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(redirect_stdout(devnull))
+
+        results = {}
+        agent = DataAgent(base_path=data_dir, partitions=False)
+
+        if "data_agent_load" in ops:
+            results["data_agent_load"] = measure(
+                lambda: DataAgent(base_path=data_dir, partitions=False), [()] * load_repeats, warmup=0
+            )
+
+        if "nearest_shelters" in ops:
+            results["nearest_shelters"] = measure(
+                lambda lat, lon: agent.get_nearest_shelters(lat, lon, limit=5), points
+            )
+
+        if "nearest_shelters_filtered" in ops:
+            # rare combination (well under 1% of shelters), the worst case for widening searches
+            rare = ["accessible", "pets", "generator", "open"]
+            agent.shelter_index()
+            results["nearest_shelters_filtered"] = measure(
+                lambda lat, lon: agent.get_nearest_shelters(lat, lon, limit=5, filters=rare), points
+            )
+
+        if "partitioned_load" in ops or "nearest_shelters_partitioned" in ops:
+            # kept apart from <data_dir>/partitions so the other ops stay eager
+            partition_dir = os.path.join(data_dir, "bench_partitions")
+            if not os.path.exists(os.path.join(partition_dir, partitions.INDEX_FILE)):
+                partitions.build_partitions(agent, partition_dir)
+
+            if "partitioned_load" in ops:
+                results["partitioned_load"] = measure(
+                    lambda: DataAgent(base_path=data_dir, partitions=partition_dir),
+                    [()] * load_repeats, warmup=0,
+                )
+
+            if "nearest_shelters_partitioned" in ops:
+                lazy_agent = DataAgent(base_path=data_dir, partitions=partition_dir)
+                results["nearest_shelters_partitioned"] = measure(
+                    lambda lat, lon: lazy_agent.get_nearest_shelters(lat, lon, limit=5), points
+                )
+                results["nearest_shelters_partitioned"]["tiles"] = lazy_agent.partitions.stats()
+
+        if "assign_evacuees" in ops:
+            origins = pd.DataFrame(
+                synthetic.query_points(scale, assignment_origins, seed=seed + 2), columns=["lat", "lon"]
+            )
+            origins["people"] = np.random.default_rng(seed).integers(1, 6, len(origins))
+            results["assign_evacuees"] = measure(
+                lambda: assign_evacuees(agent, origins, statuses=None), [()] * 3, warmup=0
+            )
+            results["assign_evacuees"]["origins"] = len(origins)
+
+        if "get_routes" in ops:
+            calls = []
+            for lat, lon in points:
+                nearest = agent.get_nearest_shelters(lat, lon, limit=5)["nearest_shelters"]
+                calls.append((lat, lon, {s["name"]: [s["lat"], s["lon"]] for s in nearest}))
+            results["get_routes"] = measure(RoutingAgent.get_routes, calls)
+
+        if "get_routes_degraded" in ops:
+            # primary endpoint much slower than usual, healthy secondary: hedging should cap the tail
+            slow = stubs.osrm_stub((osrm_delay_ms + degraded_delay_ms) / 1000)
+            with stubs.running(slow) as slow_url:
+                routing_agent.OSRM_URLS = [slow_url, osrm_url]
+                calls = []
+                for lat, lon in points:
+                    nearest = agent.get_nearest_shelters(lat, lon, limit=5)["nearest_shelters"]
+                    calls.append((lat, lon, {s["name"]: [s["lat"], s["lon"]] for s in nearest}))
+                results["get_routes_degraded"] = measure(RoutingAgent.get_routes, calls)
+                results["get_routes_degraded"]["osrm"] = routing_agent.client().stats()
+                routing_agent.OSRM_URLS = [osrm_url]
+
+        if "interpret_query" in ops:
+            calls = [(QUERIES[i % len(QUERIES)],) for i in range(queries)]
+            results["interpret_query"] = measure(orchestration.interpret_query, calls)
+
+        if "generate_response" in ops:
+            lat, lon = points[0]
+            context = orchestration.main(QUERIES[1], lat, lon)
+            calls = [(QUERIES[1], context)] * queries
+            results["generate_response"] = measure(generate_response, calls)
+
+        if "orchestration_main" in ops:
+            calls = [
+                (QUERIES[i % len(QUERIES)], lat, lon)
+                for i, (lat, lon) in enumerate(points[:main_runs])
+            ]
+            results["orchestration_main"] = measure(orchestration.main, calls)
+
+        for op in ("service", "service_cached"):
+            if op not in ops:
+                continue
+            from ..api.server import Service, start_background
+
+            cached = op == "service_cached"
+            RESULT_CACHE.enabled = orchestration.INTENT_CACHE.enabled = cached
+            RESULT_CACHE.clear()
+            orchestration.INTENT_CACHE.clear()
+            # with the cache on, simulate a crowd: many requests from a few places
+            origins = points[:max(len(points) // 8, 1)] if cached else points
+            base_url, stop = start_background(Service(agent=agent, max_inflight=concurrency))
+            try:
+                calls = [
+                    (f"{base_url}/answer", {"query": QUERIES[i % len(QUERIES)], "lat": lat, "lon": lon})
+                    for i, (lat, lon) in ((i, origins[i % len(origins)]) for i in range(len(points)))
+                ]
+                if not cached:
+                    post_json(*calls[0])
+                results[op] = measure_concurrent(post_json, calls, concurrency)
+                if cached:
+                    results[op]["cache"] = RESULT_CACHE.stats()
+            finally:
+                stop()
+                RESULT_CACHE.enabled = orchestration.INTENT_CACHE.enabled = False
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": dataset,
+            "queries": queries,
+            "llm_delay_ms": llm_delay_ms,
+            "osrm_delay_ms": osrm_delay_ms,
+            "concurrency": concurrency,
+            "degraded_delay_ms": degraded_delay_ms,
+        },
+        "results": results,
+    }
+
+
+# -------------------------------------------------------------
+def compare(report, baseline, tolerance=0.10):
+    """
+    Compare a report against a baseline report.
+
+    Returns one row per (operation, metric) present in both; a row is a
+    regression when it is worse than the baseline by more than tolerance.
+    """
+    rows = []
+    for op, current in report["results"].items():
+        base = baseline.get("results", {}).get(op)
+        if not base:
+            continue
+        for metric, bigger_is_worse in COMPARED_METRICS.items():
+            cur_v, base_v = current.get(metric), base.get(metric)
+            if cur_v is None or not base_v:
+                continue
+            ratio = cur_v / base_v
+            worse = ratio > 1 + tolerance if bigger_is_worse else ratio < 1 - tolerance
+            rows.append({
+                "op": op,
+                "metric": metric,
+                "baseline": base_v,
+                "current": cur_v,
+                "ratio": round(ratio, 3),
+                "regression": worse,
+            })
+    return rows
+
+
+def print_report(report, comparison=None):
+    print(f"\nDataset: {report['meta']['dataset']}")
+    print(f"{'operation':<30}{'n':>5}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>10}{'peak MB':>10}")
+    for op, r in report["results"].items():
+        print(
+            f"{op:<30}{r['n']:>5}{r['p50_ms']:>11.2f}{r['p95_ms']:>11.2f}"
+            f"{r['p99_ms']:>11.2f}{r['throughput_per_s'] or 0:>10.2f}{r['peak_mem_mb'] or 0:>10.2f}"
+        )
+
+    if comparison:
+        print(f"\n{'operation':<30}{'metric':<18}{'baseline':>12}{'current':>12}{'ratio':>8}")
+        for row in comparison:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['op']:<30}{row['metric']:<18}{row['baseline']:>12.2f}"
+                f"{row['current']:>12.2f}{row['ratio']:>8.2f}{flag}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shelter pipeline on synthetic data.")
+    parser.add_argument("--scale", choices=list(synthetic.SCALES), default="ct")
+    parser.add_argument("--data-dir", help="synthetic dataset directory (default bench_data/<scale>)")
+    parser.add_argument("--ops", nargs="+", choices=ALL_OPS, help="subset of operations to run")
+    parser.add_argument("--queries", type=int, default=50, help="query points per operation")
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--main-runs", type=int, default=10)
+    parser.add_argument("--origins", type=int, default=100_000, help="origins for assign_evacuees")
+    parser.add_argument("--llm-delay-ms", type=float, default=0.0, help="simulated LLM latency")
+    parser.add_argument("--osrm-delay-ms", type=float, default=0.0, help="simulated OSRM latency")
+    parser.add_argument("--degraded-delay-ms", type=float, default=500.0,
+                        help="extra latency of the degraded primary in get_routes_degraded")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads for the service op")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="baseline report to compare against")
+    parser.add_argument("--save-baseline", help="also write this run as a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or os.path.join("bench_data", args.scale)
+    report = run_benchmarks(
+        args.scale, data_dir,
+        ops=args.ops,
+        queries=args.queries,
+        load_repeats=args.load_repeats,
+        main_runs=args.main_runs,
+        llm_delay_ms=args.llm_delay_ms,
+        osrm_delay_ms=args.osrm_delay_ms,
+        seed=args.seed,
+        assignment_origins=args.origins,
+        concurrency=args.concurrency,
+        degraded_delay_ms=args.degraded_delay_ms,
+    )
+
+    comparison = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            comparison = compare(report, json.load(f), args.tolerance)
+        report["comparison"] = comparison
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print_report(report, comparison)
+    print(f"\nWrote {args.out}")
+
+    if args.fail_on_regression and comparison and any(r["regression"] for r in comparison):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Import-time report for the pipeline modules, using `python -X importtime`.
+
+Imports the given modules in a fresh interpreter and lists the slowest ones
+by cumulative time (only imports caused by the modules, not interpreter
+startup), so heavy modules sneaking back onto the CLI path are easy to spot:
+
+    python -m src.benchmark.importtime
+    python -m src.benchmark.importtime src.api.server --top 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# what `python main.py "<query>"` imports before any work happens
+CLI_MODULES = ["src.orchestration.orchestration", "src.response_agent.response_agent"]
+
+_MARKER = "--sdp-importtime-start--"
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def parse_importtime(stderr):
+    """Rows of {"module", "depth", "self_ms", "cumulative_ms"} after the marker line."""
+    rows = []
+    started = False
+    for line in stderr.splitlines():
+        if line.strip() == _MARKER:
+            started = True
+            continue
+        if not started or not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+def measure(modules=None, python=sys.executable, cwd=ROOT_DIR):
+    """Import modules in a fresh interpreter; returns the report dict."""
+    modules = modules or CLI_MODULES
+    code = f"import sys; sys.stderr.write({_MARKER!r} + '\\n'); import " + ", ".join(modules)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code], cwd=cwd, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+    rows = parse_importtime(proc.stderr)
+    return {
+        "modules": modules,
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(sum(r["cumulative_ms"] for r in rows if r["depth"] == 0), 1),
+        "module_count": len(rows),
+        "rows": rows,
+    }
+
+
+def print_report(report, top=15):
+    print(f"Imported {', '.join(report['modules'])}")
+    print(f"  {report['module_count']} modules, {report['import_ms']:.1f} ms importing, "
+          f"{report['wall_ms']:.1f} ms wall (incl. interpreter start)")
+    print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+    for row in sorted(report["rows"], key=lambda r: -r["cumulative_ms"])[:top]:
+        print(f"{row['cumulative_ms']:>14.1f}{row['self_ms']:>10.1f}  {'  ' * row['depth']}{row['module']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import time of pipeline modules.")
+    parser.add_argument("modules", nargs="*", help=f"modules to import (default: {' '.join(CLI_MODULES)})")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = measure(args.modules or None)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (pct in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(seconds, wall_seconds=None):
+    """
+    Summarize a list of per-call latencies (in seconds).
+
+    wall_seconds is the elapsed time of the whole batch; when calls ran
+    concurrently it is smaller than sum(seconds) and gives the real throughput.
+    """
+    if not seconds:
+        return {"n": 0}
+
+    wall = wall_seconds if wall_seconds is not None else sum(seconds)
+    return {
+        "n": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+        "throughput_per_s": round(len(seconds) / wall, 3) if wall > 0 else None,
+    }
@@ -0,0 +1,180 @@
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import polyline
+
+# -------------------------------------------------------------
+# Local stand-ins for the external backends (OSRM and Ollama), so the
+# pipeline can be benchmarked without network access or a GPU.
+# Each stub is a real HTTP server on 127.0.0.1, so the production
+# client code (requests / ollama) runs unchanged against it.
+# -------------------------------------------------------------
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.server.delay_s:
+            time.sleep(self.server.delay_s)
+
+
+# -------------------------------------------------------------
+ROUTE_RE = re.compile(
+    r"^/route/v1/\w+/(-?[\d.]+),(-?[\d.]+);(-?[\d.]+),(-?[\d.]+)"
+)
+
+
+class OSRMStubHandler(_StubHandler):
+    """Answers /route/v1/... with a straight-line route in OSRM's response shape."""
+
+    def do_GET(self):
+        self._delay()
+        self.server.requests += 1
+
+        m = ROUTE_RE.match(self.path)
+        if not m:
+            self._send_json(400, {"code": "InvalidUrl", "message": self.path})
+            return
+        if self.server.fail:
+            self._send_json(503, {"code": "Unavailable"})
+            return
+
+        lon1, lat1, lon2, lat2 = (float(v) for v in m.groups())
+        n = self.server.path_points
+        path = [
+            (lat1 + (lat2 - lat1) * i / (n - 1), lon1 + (lon2 - lon1) * i / (n - 1))
+            for i in range(n)
+        ]
+
+        # ~ 1 degree = 111 km, padded a little for "road" distance
+        distance = ((lat2 - lat1) ** 2 + (lon2 - lon1) ** 2) ** 0.5 * 111_000 * 1.3
+        steps = [
+            {
+                "name": f"Stub Road {i}",
+                "maneuver": {
+                    "instruction": f"Continue on Stub Road {i}",
+                    "location": [path[i][1], path[i][0]],
+                },
+            }
+            for i in range(0, n, max(1, n // 8))
+        ]
+
+        self._send_json(200, {
+            "code": "Ok",
+            "routes": [{
+                "distance": distance,
+                "duration": distance / 13.4,
+                "geometry": polyline.encode(path),
+                "legs": [{"steps": steps}],
+            }],
+        })
+
+
+# -------------------------------------------------------------
+class OllamaStubHandler(_StubHandler):
+    """
+    Answers /api/chat like a non-streaming Ollama server.
+
+    Classification prompts (format="json") get a filled-in template chosen
+    by keywords; everything else gets a short canned summary.
+    """
+
+    ROUTING_WORDS = ("route", "direction", "get to", "how do i get", "drive", "way to")
+    SHELTER_WORDS = ("shelter", "evacuat", "flood", "hurricane", "storm", "safe")
+
+    def do_POST(self):
+        self._delay()
+        self.server.requests += 1
+
+        if self.path.rstrip("/") != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+
+        if body.get("format") == "json":
+            content = self._classify(prompt)
+        else:
+            content = self._summarize(prompt)
+
+        self._send_json(200, {
+            "model": body.get("model", "stub"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": len(content.split()),
+        })
+
+    def _classify(self, prompt):
+        m = re.search(r"'Question': ['\"](.*?)['\"], 'Response'", prompt, re.S)
+        question = (m.group(1) if m else prompt).lower()
+
+        need_routing = any(w in question for w in self.ROUTING_WORDS)
+        need_shelter = need_routing or any(w in question for w in self.SHELTER_WORDS)
+
+        return json.dumps({
+            "Question": question,
+            "Response": {
+                "need_shelter_data": {"Description": "", "Value": str(need_shelter)},
+                "need_routing_data": {"Description": "", "Value": str(need_routing)},
+            },
+        })
+
+    def _summarize(self, prompt):
+        names = re.findall(r'"name": "([^"]+)"', prompt)
+        lines = ["I looked up shelters near your location to help you decide."]
+        lines += [f"- {name}" for name in dict.fromkeys(names)]
+        return "\n".join(lines)
+
+
+# -------------------------------------------------------------
+def _make_server(handler, delay_s=0.0, port=0, **attrs):
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.delay_s = delay_s
+    server.requests = 0
+    for key, value in attrs.items():
+        setattr(server, key, value)
+    return server
+
+
+@contextmanager
+def running(server):
+    """Serve in a background thread; yields the base URL."""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"http://{host}:{port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def osrm_stub(delay_s=0.0, path_points=200, fail=False, port=0):
+    return _make_server(OSRMStubHandler, delay_s, port, path_points=path_points, fail=fail)
+
+
+def ollama_stub(delay_s=0.0, port=0):
+    return _make_server(OllamaStubHandler, delay_s, port)
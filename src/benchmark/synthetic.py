@@ -0,0 +1,191 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Rough (lat_min, lat_max, lon_min, lon_max) boxes, good enough for synthetic points
+STATE_BOXES = {
+    "CT": (40.98, 42.05, -73.73, -71.79),
+    "RI": (41.15, 42.02, -71.86, -71.12),
+    "MA": (41.24, 42.89, -73.50, -69.93),
+    "VT": (42.73, 45.02, -73.44, -71.46),
+    "NH": (42.70, 45.31, -72.56, -70.61),
+    "ME": (43.06, 47.46, -71.08, -66.95),
+    "NY": (40.50, 45.02, -79.76, -71.86),
+    "NJ": (38.93, 41.36, -75.56, -73.89),
+    "PA": (39.72, 42.27, -80.52, -74.69),
+    "MD": (37.91, 39.72, -79.49, -75.05),
+    "VA": (36.54, 39.47, -83.68, -75.24),
+    "NC": (33.84, 36.59, -84.32, -75.46),
+    "SC": (32.03, 35.22, -83.35, -78.54),
+    "GA": (30.36, 35.00, -85.61, -80.84),
+    "FL": (24.52, 31.00, -87.63, -80.03),
+    "AL": (30.22, 35.01, -88.47, -84.89),
+    "MS": (30.17, 35.00, -91.66, -88.10),
+    "LA": (28.93, 33.02, -94.04, -88.82),
+    "TX": (25.84, 36.50, -106.65, -93.51),
+    "OK": (33.62, 37.00, -103.00, -94.43),
+    "TN": (34.98, 36.68, -90.31, -81.65),
+    "KY": (36.50, 39.15, -89.57, -81.96),
+    "OH": (38.40, 41.98, -84.82, -80.52),
+    "MI": (41.70, 45.80, -86.50, -82.41),
+    "IN": (37.77, 41.76, -88.10, -84.78),
+    "IL": (36.97, 42.51, -91.51, -87.50),
+    "WI": (42.49, 47.08, -92.89, -86.81),
+    "MN": (43.50, 49.38, -97.24, -89.49),
+    "IA": (40.38, 43.50, -96.64, -90.14),
+    "MO": (35.99, 40.61, -95.77, -89.10),
+    "AR": (33.00, 36.50, -94.62, -89.64),
+    "KS": (36.99, 40.00, -102.05, -94.59),
+    "NE": (40.00, 43.00, -104.05, -95.31),
+    "CO": (36.99, 41.00, -109.06, -102.04),
+    "NM": (31.33, 37.00, -109.05, -103.00),
+    "AZ": (31.33, 37.00, -114.82, -109.05),
+    "UT": (37.00, 42.00, -114.05, -109.04),
+    "NV": (35.00, 42.00, -120.01, -114.04),
+    "CA": (32.53, 42.01, -124.41, -114.13),
+    "OR": (41.99, 46.29, -124.57, -116.46),
+    "WA": (45.54, 49.00, -124.76, -116.92),
+    "ID": (41.99, 49.00, -117.24, -111.04),
+    "MT": (44.36, 49.00, -116.05, -104.04),
+    "WY": (40.99, 45.01, -111.06, -104.05),
+}
+
+SCALES = {
+    "ct": {
+        "states": ["CT"],
+        "shelters": 800,
+        "flood_polygons": 5_000,
+    },
+    "multistate": {
+        "states": ["CT", "RI", "MA", "VT", "NH", "ME", "NY", "NJ", "PA"],
+        "shelters": 10_000,
+        "flood_polygons": 40_000,
+    },
+    "national": {
+        "states": list(STATE_BOXES),
+        "shelters": 70_000,
+        "flood_polygons": 200_000,
+    },
+}
+
+FLOOD_ZONES = [
+    # (FLD_ZONE, ZONE_SUBTY, SFHA_TF, weight)
+    ("AE", "", "T", 0.30),
+    ("A", "", "T", 0.10),
+    ("VE", "", "T", 0.05),
+    ("X", "0.2 PCT ANNUAL CHANCE FLOOD HAZARD", "F", 0.20),
+    ("X", "AREA OF MINIMAL FLOOD HAZARD", "F", 0.35),
+]
+
+
+def _random_points(rng, states, n):
+    """Spread n points over the given states, proportional to box area."""
+    boxes = np.array([STATE_BOXES[s] for s in states])
+    areas = (boxes[:, 1] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 2])
+    which = rng.choice(len(states), size=n, p=areas / areas.sum())
+
+    lat = rng.uniform(boxes[which, 0], boxes[which, 1])
+    lon = rng.uniform(boxes[which, 2], boxes[which, 3])
+    return lat, lon, np.array(states)[which]
+
+
+def make_shelters(rng, states, n):
+    """Synthetic shelter records shaped like the FEMA shapefile + cleaned CSV."""
+    lat, lon, state = _random_points(rng, states, n)
+    ids = np.arange(n)
+
+    shelters = gpd.GeoDataFrame(
+        {
+            "shelter_na": [f"SYNTHETIC SHELTER {i:06d}" for i in ids],
+            "address_1": [f"{i % 9000 + 1} MAIN ST" for i in ids],
+            "city": [f"TOWN {i % 500:03d}" for i in ids],
+            "state": state,
+            "zip": rng.integers(1000, 99999, size=n).astype(str),
+            "shelter_st": rng.choice(["OPEN", "CLOSED", "FULL"], size=n, p=[0.2, 0.75, 0.05]),
+        },
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+
+    capacity = rng.integers(20, 800, size=n)
+    attributes = pd.DataFrame({
+        "shelter_na": shelters["shelter_na"],
+        "evacuation": capacity,
+        "total_popu": (capacity * rng.uniform(0, 0.6, size=n)).astype(int),
+        "wheelchair": rng.choice(["YES", "NO", ""], size=n, p=[0.5, 0.3, 0.2]),
+        "pet_accomm": rng.choice(["YES", "NO", ""], size=n, p=[0.15, 0.6, 0.25]),
+        "generator_": rng.choice(["YES", "NO", ""], size=n, p=[0.3, 0.5, 0.2]),
+        "latitude": lat,
+        "longitude": lon,
+    })
+    return shelters, attributes
+
+
+def make_flood_zones(rng, states, n):
+    """Synthetic FEMA flood hazard polygons (small boxes) over the given states."""
+    lat, lon, _ = _random_points(rng, states, n)
+    half_w = rng.uniform(0.001, 0.01, size=n)
+    half_h = rng.uniform(0.001, 0.01, size=n)
+
+    weights = np.array([z[3] for z in FLOOD_ZONES])
+    kind = rng.choice(len(FLOOD_ZONES), size=n, p=weights / weights.sum())
+
+    return gpd.GeoDataFrame(
+        {
+            "FLD_ZONE": [FLOOD_ZONES[k][0] for k in kind],
+            "ZONE_SUBTY": [FLOOD_ZONES[k][1] for k in kind],
+            "SFHA_TF": [FLOOD_ZONES[k][2] for k in kind],
+        },
+        geometry=shapely.box(lon - half_w, lat - half_h, lon + half_w, lat + half_h),
+        crs="EPSG:4326",
+    )
+
+
+def query_points(scale, n, seed=1):
+    """Random (lat, lon) query origins inside the states of a scale."""
+    rng = np.random.default_rng(seed)
+    lat, lon, _ = _random_points(rng, SCALES[scale]["states"], n)
+    return list(zip(lat.tolist(), lon.tolist()))
+
+
+def generate(scale, out_dir, seed=0):
+    """
+    Write a synthetic dataset laid out like src/data_agent/data, so that
+    DataAgent(base_path=out_dir) loads it unchanged.
+
+    The flood layer is always written as hazards/floods/CT_Flood_Zones.shp,
+    because that is the only hazard path DataAgent reads.
+    """
+    spec = SCALES[scale]
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(os.path.join(out_dir, "hazards", "floods"), exist_ok=True)
+
+    shelters, attributes = make_shelters(rng, spec["states"], spec["shelters"])
+    shelters.to_file(os.path.join(out_dir, "National_Shelter_System_Facilities.shp"))
+    attributes.to_csv(os.path.join(out_dir, "fema_shelters_clean.csv"), index=False)
+
+    floods = make_flood_zones(rng, spec["states"], spec["flood_polygons"])
+    floods.to_file(os.path.join(out_dir, "hazards", "floods", "CT_Flood_Zones.shp"))
+
+    meta = {
+        "scale": scale,
+        "seed": seed,
+        "states": len(spec["states"]),
+        "shelters": len(shelters),
+        "flood_polygons": len(floods),
+    }
+    with open(os.path.join(out_dir, "dataset.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+if __name__ == "__main__":
+    import sys
+
+    scale = sys.argv[1] if len(sys.argv) > 1 else "ct"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join("bench_data", scale)
+    print(json.dumps(generate(scale, out_dir), indent=2))
@@ -0,0 +1,204 @@
+"""
+Result cache for shelter answers, bucketed by geohash cell.
+
+During an event many users in the same town ask near-identical questions
+within minutes. The shelter scan is cached under a key made of the geohash
+cell of the origin, the filters and the shelter data version, so everyone in
+a cell (about 1.2 x 0.6 km at precision 6) shares one scan. The scan holds
+every shelter that can be among the nearest ones for any point of the cell
+(geohash_bounds gives its extent), and no requester's position; distances,
+routes and summaries are still computed per caller from their own location.
+
+Concurrent misses on the same key are coalesced (single-flight): one caller
+computes, the others wait for its result. Entries expire after a TTL and the
+least recently used ones are evicted past max_entries.
+
+    from src.cache import RESULT_CACHE
+    value = RESULT_CACHE.get_or_compute(key, compute)
+    RESULT_CACHE.stats()   # hits, misses, coalesced, hit_rate, saved_seconds
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from . import tracing
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lon, precision=6):
+    """Standard base32 geohash of a point."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = value * 2 + 1
+                lon_lo = mid
+            else:
+                value *= 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(code):
+    """(lat_lo, lat_hi, lon_lo, lon_hi) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for ch in code:
+        value = _BASE32.index(ch)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def normalize_query(query):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    kept = "".join(ch if ch.isalnum() else " " for ch in str(query).lower())
+    return " ".join(kept.split())
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error", "seconds")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.seconds = 0.0
+
+
+class ResultCache:
+    """Thread-safe TTL + LRU cache with single-flight computation."""
+
+    def __init__(self, ttl_s=300.0, max_entries=1024, enabled=True):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self._entries = OrderedDict()   # key -> (value, expires_at, compute seconds)
+        self._flights = {}              # key -> _Flight in progress
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: value is not None):
+        """
+        Cached value for key, or compute() it once for all concurrent callers.
+        Values for which cacheable(value) is false (by default None, i.e. an
+        error) are returned but not stored; exceptions reach every waiter.
+        """
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, seconds = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += seconds
+                    tracing.current().set(cache="hit")
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            waited = time.perf_counter()
+            tracing.current().set(cache="coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self.saved_seconds += max(flight.seconds - (time.perf_counter() - waited), 0.0)
+            return flight.value
+
+        tracing.current().set(cache="miss")
+        start = time.perf_counter()
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            flight.seconds = time.perf_counter() - start
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and cacheable(flight.value):
+                    self._store(key, flight.value, flight.seconds)
+            flight.done.set()
+        return flight.value
+
+    def _store(self, key, value, seconds):
+        self._entries[key] = (value, time.monotonic() + self.ttl_s, seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+# shared by the orchestration pipeline, the Streamlit bridge and the API service
+RESULT_CACHE = ResultCache(
+    ttl_s=float(os.environ.get("RESULT_CACHE_TTL", 300)),
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", 1024)),
+    enabled=os.environ.get("RESULT_CACHE", "1") != "0",
+)
+GEOHASH_PRECISION = int(os.environ.get("RESULT_CACHE_PRECISION", 6))
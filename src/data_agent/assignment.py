@@ -0,0 +1,278 @@
+"""
+Capacity-aware mass assignment of evacuees to shelters.
+
+get_nearest_shelters sends everyone to the same nearest shelter. For
+evacuation planning, assign_evacuees instead spreads many origins over the
+shelters in DataAgent's data while respecting remaining capacity
+(evacuation - total_popu), shelter status and wheelchair accessibility.
+
+The problem is solved as an auction (Bertsekas) on a sparse candidate graph:
+each origin only considers its k nearest eligible shelters. Unassigned
+origins bid for their best shelter (distance + price) in vectorized rounds;
+over-subscribed shelters keep the highest bids and raise their price, which
+pushes the rest towards their next-best candidate. An origin whose best
+option costs more than unassigned_penalty_miles stays unassigned (overflow).
+Bid increments start coarse and are refined down to eps (epsilon-scaling),
+so heavily contested shelters settle in a few hundred rounds at most.
+
+    from src.data_agent.assignment import assign_evacuees
+    result = assign_evacuees(agent, origins)   # origins: lat, lon[, people, needs_accessible]
+    result["shelters"]   # per-shelter load report
+"""
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from .. import tracing
+from .spatial import PointIndex, geodesic_miles
+
+
+def _numeric(df, column):
+    if column not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[column], errors="coerce").fillna(0)
+
+
+def remaining_capacity(shelters):
+    """Spaces left per shelter: evacuation capacity minus current population."""
+    capacity = _numeric(shelters, "evacuation") - _numeric(shelters, "total_popu")
+    return capacity.clip(lower=0).astype(int)
+
+
+def _candidates(shelters, eligible, origin_lat, origin_lon, k):
+    """(n, k) shelter positions (-1 = none) of the k nearest eligible shelters."""
+    positions = np.flatnonzero(eligible)
+    index = PointIndex(shelters.geometry.y.values[positions], shelters.geometry.x.values[positions])
+    nn = index.query(origin_lat, origin_lon, min(k, len(index)) or k)
+    return np.where(nn >= 0, positions[np.maximum(nn, 0)], -1)
+
+
+def auction(cost, cand, demand, capacity, penalty, eps_schedule, max_rounds=10_000):
+    """
+    Capacitated auction on a sparse candidate graph.
+
+    cost[i, c] is the distance from origin i to shelter cand[i, c] (inf when
+    the pair is not allowed). Bids use the increments in eps_schedule in
+    turn: a coarse increment settles contested prices in few rounds, and
+    each finer phase continues from the current prices and assignment.
+    Returns (shelter per origin or -1, rounds).
+    """
+    n, k = cost.shape
+    rows = np.arange(n)
+    price = np.zeros(len(capacity))
+    assigned = np.full(n, -1)
+    assigned_bid = np.zeros(n)
+
+    free = np.flatnonzero(np.isfinite(cost).any(axis=1))
+    given_up = np.zeros(n, dtype=bool)
+    rounds = 0
+    for eps in eps_schedule:
+        # origins that gave up at a coarser increment get another chance
+        free = np.union1d(free, np.flatnonzero(given_up))
+        given_up[:] = False
+        free, rounds = _auction_phase(
+            cost, cand, demand, capacity, penalty, eps, price, assigned, assigned_bid,
+            free, given_up, rows, rounds, max_rounds,
+        )
+    return assigned, rounds
+
+
+def _auction_phase(cost, cand, demand, capacity, penalty, eps, price, assigned, assigned_bid,
+                   free, given_up, rows, rounds, max_rounds):
+    """Bid rounds at one increment; updates price/assigned/assigned_bid in place."""
+    k = cost.shape[1]
+    while free.size and rounds < max_rounds:
+        rounds += 1
+        j = cand[free]
+        value = -cost[free] - price[np.maximum(j, 0)]
+
+        # best and second-best candidate; "stay unassigned" is worth -penalty
+        if k > 1:
+            top2 = np.argpartition(-value, 1, axis=1)[:, :2]
+            v2 = value[rows[:len(free), None], top2]
+            first = np.where(v2[:, 0] >= v2[:, 1], top2[:, 0], top2[:, 1])
+            second_v = np.minimum(v2[:, 0], v2[:, 1])
+        else:
+            first = np.zeros(len(free), dtype=int)
+            second_v = np.full(len(free), -np.inf)
+        best_v = value[np.arange(len(free)), first]
+        second_v = np.maximum(second_v, -penalty)
+
+        bidding = best_v >= -penalty
+        given_up[free[~bidding]] = True
+        bidders = free[bidding]
+        if not bidders.size:
+            break
+        bid_shelter = j[bidding, first[bidding]]
+        bid = price[bid_shelter] + (best_v - second_v)[bidding] + eps
+
+        # shelters keep their highest bids (current holders included) up to capacity
+        touched = np.unique(bid_shelter)
+        holders = np.flatnonzero(np.isin(assigned, touched))
+        o = np.concatenate([holders, bidders])
+        s = np.concatenate([assigned[holders], bid_shelter])
+        b = np.concatenate([assigned_bid[holders], bid])
+
+        order = np.lexsort((-b, s))
+        o, s, b = o[order], s[order], b[order]
+        d = demand[o]
+        cum = np.cumsum(d)
+        starts = np.r_[0, np.flatnonzero(np.diff(s)) + 1]
+        group_base = np.repeat(cum[starts] - d[starts], np.diff(np.r_[starts, len(s)]))
+        accept = (cum - group_base) <= capacity[s]
+
+        assigned[o[accept]] = s[accept]
+        assigned_bid[o[accept]] = b[accept]
+        assigned[o[~accept]] = -1
+
+        # a shelter that turned someone away is full: its price is its lowest accepted bid
+        full = np.unique(s[~accept])
+        lowest = np.full(len(capacity), np.inf)
+        np.minimum.at(lowest, s[accept], b[accept])
+        price[full] = np.where(np.isfinite(lowest[full]), lowest[full], price[full])
+
+        free = o[~accept]
+
+    return free, rounds
+
+
+def eps_schedule(eps, penalty, factor=5.0):
+    """Bid increments from penalty/100 down to eps."""
+    schedule = [max(eps, penalty / 100)]
+    while schedule[-1] > eps:
+        schedule.append(max(eps, schedule[-1] / factor))
+    return schedule
+
+
+# -------------------------------------------------------------
+@tracing.traced("assignment.assign_evacuees")
+def assign_evacuees(agent, origins, k=8, statuses=("OPEN",), max_distance_miles=None,
+                    unassigned_penalty_miles=250.0, eps=None):
+    """
+    Assign origins to shelters respecting capacity, status and accessibility.
+
+    origins: DataFrame with "lat", "lon", optional "people" (party size,
+        default 1) and optional "needs_accessible" (bool).
+    k: candidate shelters considered per origin.
+    statuses: allowed shelter_st values (None allows every status, e.g. for
+        pre-event planning when shelters are still closed).
+    max_distance_miles: drop candidate shelters farther than this.
+    eps: auction bid increment in miles (default: 1% of the median
+        candidate distance); smaller is closer to optimal but slower.
+
+    Returns {"assignments": DataFrame per origin, "shelters": per-shelter
+    load report, "summary": dict}.
+    """
+    start = time.perf_counter()
+    origin_lat = origins["lat"].to_numpy(dtype=float)
+    origin_lon = origins["lon"].to_numpy(dtype=float)
+    people = (
+        origins["people"].fillna(1).to_numpy(dtype=int) if "people" in origins.columns
+        else np.ones(len(origins), dtype=int)
+    )
+    needs_accessible = (
+        origins["needs_accessible"].fillna(False).to_numpy(dtype=bool)
+        if "needs_accessible" in origins.columns else np.zeros(len(origins), dtype=bool)
+    )
+
+    # shelters around the origins (plus a margin for ones just outside the box)
+    margin = 1.0
+    shelters = None
+    if len(origins):
+        bounds = (
+            origin_lat.min() - margin, origin_lat.max() + margin,
+            origin_lon.min() - margin, origin_lon.max() + margin,
+        )
+        shelters = agent.shelter_frame(bounds)
+    if shelters is None or not len(shelters):
+        # nothing in reach (a partitioned frame may not even have columns): everyone stays unassigned
+        shelters = gpd.GeoDataFrame({"shelter_na": [], "city": [], "state": []}, geometry=[], crs="EPSG:4326")
+    shelters = shelters.drop_duplicates(["shelter_na", "city", "state"]).reset_index(drop=True)
+    capacity = remaining_capacity(shelters).to_numpy()
+
+    eligible = capacity > 0
+    if statuses is not None and "shelter_st" in shelters.columns:
+        allowed = {str(v).upper() for v in statuses}
+        eligible &= shelters["shelter_st"].astype(str).str.upper().isin(allowed).to_numpy()
+    accessible = (
+        shelters["handicap_accessible"].astype(str).str.lower().eq("yes").to_numpy()
+        if "handicap_accessible" in shelters.columns else np.zeros(len(shelters), dtype=bool)
+    )
+
+    with tracing.span("assignment.candidates", origins=len(origins), shelters=int(eligible.sum()), k=k):
+        cand = np.full((len(origins), k), -1)
+        for need, mask in ((False, eligible), (True, eligible & accessible)):
+            rows = np.flatnonzero(needs_accessible == need)
+            if rows.size and mask.any():
+                found = _candidates(shelters, mask, origin_lat[rows], origin_lon[rows], k)
+                cand[rows, :found.shape[1]] = found
+
+        cost = np.full(cand.shape, np.inf)
+        if len(shelters):
+            valid = cand >= 0
+            slat = shelters.geometry.y.to_numpy()[np.maximum(cand, 0)]
+            slon = shelters.geometry.x.to_numpy()[np.maximum(cand, 0)]
+            cost = geodesic_miles(origin_lat[:, None], origin_lon[:, None], slat, slon)
+            valid &= capacity[np.maximum(cand, 0)] >= people[:, None]
+            if max_distance_miles is not None:
+                valid &= cost <= max_distance_miles
+            cost = np.where(valid, cost, np.inf)
+
+    if eps is None:
+        finite = cost[np.isfinite(cost)]
+        eps = max(0.01 * float(np.median(finite)), 1e-3) if finite.size else 0.01
+
+    with tracing.span("assignment.auction") as s:
+        shelter_of, rounds = auction(
+            cost, cand, people, capacity, unassigned_penalty_miles,
+            eps_schedule(eps, unassigned_penalty_miles),
+        )
+        s.set(rounds=rounds)
+
+    assigned = shelter_of >= 0
+    match = np.argmax(cand == shelter_of[:, None], axis=1)
+    distance = np.where(assigned, cost[np.arange(len(origins)), match], np.nan)
+    names = np.full(len(origins), None, dtype=object)
+    names[assigned] = shelters["shelter_na"].to_numpy()[shelter_of[assigned]]
+
+    assignments = pd.DataFrame({
+        "lat": origin_lat,
+        "lon": origin_lon,
+        "people": people,
+        "needs_accessible": needs_accessible,
+        "shelter_index": shelter_of,
+        "shelter_name": names,
+        "distance_miles": distance,
+    }, index=origins.index)
+
+    load = np.bincount(shelter_of[assigned], weights=people[assigned], minlength=len(shelters))
+    parties = np.bincount(shelter_of[assigned], minlength=len(shelters))
+    report = pd.DataFrame({
+        "name": shelters["shelter_na"].astype(str).str.title(),
+        "city": shelters.get("city"),
+        "state": shelters.get("state"),
+        "status": shelters.get("shelter_st"),
+        "lat": shelters.geometry.y,
+        "lon": shelters.geometry.x,
+        "capacity": capacity,
+        "assigned_people": load.astype(int),
+        "assigned_origins": parties,
+    })
+    report["utilization"] = np.where(capacity > 0, report["assigned_people"] / np.maximum(capacity, 1), 0.0)
+    report = report[report["assigned_origins"] > 0].sort_values("utilization", ascending=False)
+
+    summary = {
+        "origins": len(origins),
+        "people": int(people.sum()),
+        "assigned_people": int(people[assigned].sum()),
+        "unassigned_people": int(people[~assigned].sum()),
+        "unassigned_origins": int((~assigned).sum()),
+        "shelters_used": len(report),
+        "eligible_shelters": int(eligible.sum()),
+        "eligible_capacity": int(capacity[eligible].sum()),
+        "mean_distance_miles": round(float(np.nanmean(distance)), 3) if assigned.any() else None,
+        "p95_distance_miles": round(float(np.nanpercentile(distance, 95)), 3) if assigned.any() else None,
+        "auction_rounds": rounds,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return {"assignments": assignments, "shelters": report, "summary": summary}
@@ -1,14 +1,30 @@
 # data_agent.py
 import os
 import json
-import pandas as pd
-import geopandas as gpd
-from pyproj import Geod
-from shapely.geometry import Point
+import math
+import threading
+from .. import tracing
+from ..lazy import lazy_import
+from ..cache import RESULT_CACHE
+from .partitions import INDEX_FILE, PartitionStore, frame_bytes, find_partitions, tile_name, tile_of
+from .filters import FILTER_BITS, ShelterIndex, compute_filter_bits, filter_mask, filter_names, matching
+from .exposure import HazardIndex
+from .spatial import MIN_EARTH_RADIUS_MILES, geodesic_miles
+
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+pyproj = lazy_import("pyproj")
 
 class DataAgent:
 
-    geod = Geod(ellps="WGS84")  #initialize once for true Earth distances
+    _geod = None
+
+    @property
+    def geod(self):
+        """WGS84 geodesic, created once (on first use) for true Earth distances."""
+        if DataAgent._geod is None:
+            DataAgent._geod = pyproj.Geod(ellps="WGS84")
+        return DataAgent._geod
 
     @staticmethod
     def _mi(meters: float) -> float:
@@ -16,15 +32,38 @@ class DataAgent:
         return meters / 1609.34
     
 
-    def __init__(self, base_path="data"):
+    def __init__(self, base_path="data", partitions=None, memory_budget_mb=512):
+        """
+        partitions: tile directory built by partitions.py, loaded on demand.
+        None uses <base_path>/partitions when it exists; False always loads
+        the full shapefile/CSV up front.
+        """
         self.base_path = base_path
+        self.partitions = None
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._hazard_indexes = {}   # layer -> HazardIndex (eager mode; partitioned mode caches them in the store)
+        self._hazard_lock = threading.Lock()
+        self._init_args = {"base_path": base_path, "partitions": partitions, "memory_budget_mb": memory_budget_mb}
+
+        partition_dir = find_partitions(base_path) if partitions is None else partitions
+        self.data_version = self.data_fingerprint(base_path, partition_dir or None)
+        if partition_dir:
+            self.partitions = PartitionStore(partition_dir, memory_budget_mb)
+            print(
+                f"Using {self.partitions.shelter_count} shelters in "
+                f"{len(self.partitions.index['shelter_tiles'])} tiles from {partition_dir} (loaded on demand)."
+            )
+            return
 
         # --- Load FEMA shapefile ---
         shp_path = os.path.join(base_path, "National_Shelter_System_Facilities.shp")
         if not os.path.exists(shp_path):
             raise FileNotFoundError(f"Shapefile not found at {shp_path}")
 
-        self.df = gpd.read_file(shp_path)
+        with tracing.span("data_agent.load_shelters") as s:
+            self.df = gpd.read_file(shp_path)
+            s.set(rows=len(self.df))
         print(f"Loaded {len(self.df)} shelter points from FEMA dataset.")
 
         # Clean up common typos in names
@@ -33,9 +72,11 @@ class DataAgent:
         # --- Load FEMA Flood Hazard Layer ---
         hazard_path = os.path.join(base_path, "hazards", "floods", "CT_Flood_Zones.shp")
         if os.path.exists(hazard_path):
-            self.hazards = {
-                "fema_flood": gpd.read_file(hazard_path).to_crs("EPSG:4326")
-            }
+            with tracing.span("data_agent.load_hazards") as s:
+                self.hazards = {
+                    "fema_flood": gpd.read_file(hazard_path).to_crs("EPSG:4326")
+                }
+                s.set(polygons=len(self.hazards["fema_flood"]))
             print(f"Loaded {len(self.hazards['fema_flood'])} FEMA flood polygons for Connecticut.")
         else:
             print("FEMA flood hazard shapefile not found.")
@@ -45,19 +86,21 @@ class DataAgent:
         # --- Load supplemental CSV (if available) ---
         csv_path = os.path.join(base_path, "fema_shelters_clean.csv")
         if os.path.exists(csv_path):
-            csv_df = pd.read_csv(csv_path)
-
-            # Normalize names to avoid mismatch
-            csv_df["shelter_na"] = csv_df["shelter_na"].astype(str).str.strip().str.lower()
-            self.df["shelter_na"] = self.df["shelter_na"].astype(str).str.strip().str.lower()
-
-            # Merge and fix geometry
-            self.df = self.df.merge(csv_df, on="shelter_na", how="left", suffixes=("", "_csv"))
-            self.df = (
-                self.df.rename(columns={"geometry_x": "geometry"}, errors="ignore")
-                        .drop(columns=["geometry_y"], errors="ignore")
-            )
-            self.df = gpd.GeoDataFrame(self.df, geometry="geometry", crs="EPSG:4326")
+            with tracing.span("data_agent.merge_csv") as s:
+                csv_df = pd.read_csv(csv_path)
+
+                # Normalize names to avoid mismatch
+                csv_df["shelter_na"] = csv_df["shelter_na"].astype(str).str.strip().str.lower()
+                self.df["shelter_na"] = self.df["shelter_na"].astype(str).str.strip().str.lower()
+
+                # Merge and fix geometry
+                self.df = self.df.merge(csv_df, on="shelter_na", how="left", suffixes=("", "_csv"))
+                self.df = (
+                    self.df.rename(columns={"geometry_x": "geometry"}, errors="ignore")
+                            .drop(columns=["geometry_y"], errors="ignore")
+                )
+                self.df = gpd.GeoDataFrame(self.df, geometry="geometry", crs="EPSG:4326")
+                s.set(csv_rows=len(csv_df), rows=len(self.df))
 
             # Wheelchair accessibility logic setup
             if "wheelchair" in self.df.columns:
@@ -73,6 +116,33 @@ class DataAgent:
             print("Warning: CSV not found — using shapefile only.")
             self.df["handicap_accessible"] = None
 
+    # -----------------------------------------------------
+    @staticmethod
+    def data_fingerprint(base_path, partition_dir=None):
+        """
+        Cheap version tag of the data files (size + mtime). Cached answers are
+        keyed on it, so replacing the data invalidates them.
+        """
+        partition_dir = partition_dir or find_partitions(base_path)
+        paths = [
+            os.path.join(base_path, "National_Shelter_System_Facilities.shp"),
+            os.path.join(base_path, "fema_shelters_clean.csv"),
+            os.path.join(base_path, "hazards", "floods", "CT_Flood_Zones.shp"),
+        ]
+        if partition_dir:
+            paths.append(os.path.join(partition_dir, INDEX_FILE))
+        parts = []
+        for path in paths:
+            if os.path.exists(path):
+                st = os.stat(path)
+                parts.append(f"{st.st_size}-{st.st_mtime_ns}")
+        return "|".join(parts)
+
+    def reload(self):
+        """Re-read the data files in place and drop every cached answer."""
+        self.__init__(**self._init_args)
+        RESULT_CACHE.clear()
+
     # -----------------------------------------------------
     def clean_text(self, text):
         """Fix common typos and spacing in shelter names"""
@@ -85,7 +155,7 @@ class DataAgent:
     
 
     # -------------------------------------------------------------------
-    def _dedupe_by_name_city(self, df: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    def _dedupe_by_name_city(self, df: "gpd.GeoDataFrame") -> "gpd.GeoDataFrame":
         """
         Collapse records that look like the same shelter (same name+city+state),
         keeping the one that is closest to the user (smallest distance_miles).
@@ -120,8 +190,9 @@ class DataAgent:
         - Zone X shaded (0.2% annual chance) => Moderate
         - Zone X unshaded => Low
         """
-        z = (zone or "").upper().strip()
-        st = (subtype or "").upper()
+        # shapefile nulls come back as NaN, not None
+        z = zone.upper().strip() if isinstance(zone, str) else ""
+        st = subtype.upper() if isinstance(subtype, str) else ""
         sfha_flag = str(sfha_tf).upper() in {"T", "Y", "1", "TRUE", "YES"}
 
         if sfha_flag or z.startswith(("A", "V")):
@@ -135,21 +206,34 @@ class DataAgent:
 
 
     # -------------------------------------------------------------
-    def get_nearest_shelters(self, lat, lon, limit=3, state_filter=None):
-        """Find nearest shelters using true geodesic distance (WGS84)."""
-
-        df_filtered = self.df
-        if state_filter and "state" in df_filtered.columns:
-            df_filtered = df_filtered[df_filtered["state"].str.lower() == state_filter.lower()]
+    @tracing.traced("data_agent.nearest_shelters")
+    def get_nearest_shelters(self, lat, lon, limit=3, state_filter=None, filters=None):
+        """
+        Find nearest shelters using true geodesic distance (WGS84).
 
-        # Geodesic distance calculation
-        def dist_miles(point):
-            _, _, meters = self.geod.inv(lon, lat, float(point.x), float(point.y))
-            return self._mi(meters)
+        filters: names from filters.FILTER_BITS ("accessible", "pets",
+        "generator", "open", "flood_safe"); only shelters matching all of
+        them are returned, still the `limit` nearest ones. Where no flood layer
+        maps (lat, lon), flood_safe is not applied and is listed under
+        "unavailable_filters" instead.
+        """
+        required = filter_mask(filters)
+        unavailable = 0
+        if required & FILTER_BITS["flood_safe"] and not self.flood_mapped(lat, lon):
+            unavailable = FILTER_BITS["flood_safe"]
+            required &= ~unavailable
+
+        if self.partitions is not None:
+            df_filtered = self._partition_candidates(lat, lon, limit, state_filter, required)
+        else:
+            index = self.shelter_index()
+            with tracing.span("data_agent.indexed_search", filters=required) as s:
+                positions, miles = index.nearest(lat, lon, limit, required, state_filter)
+                s.set(candidates=len(positions))
+            tracing.current().set(rows=len(self.df), candidates=len(positions), limit=limit)
 
-        df_filtered = df_filtered.copy()
-        df_filtered["distance_miles"] = df_filtered.geometry.apply(dist_miles)
-        nearest = df_filtered.nsmallest(limit, "distance_miles")
+            df_filtered = self.df.iloc[positions].copy()
+            df_filtered["distance_miles"] = miles
 
         # Build a normalized dedup key (name + city + state)
         df_filtered["_dedup_key"] = (
@@ -172,30 +256,33 @@ class DataAgent:
 
         results = {
             "input_location": {"lat": lat, "lon": lon},
+            "filters": filter_names(required),
             "nearest_shelters": []
         }
+        if unavailable:
+            results["unavailable_filters"] = filter_names(unavailable)
 
         for _, row in nearest.iterrows():
 
             hazards_here = []
 
-            if hasattr(self, "hazards"):
-                shelter_gdf = gpd.GeoDataFrame(geometry=[row.geometry], crs="EPSG:4326")
-                for hname, hdf in self.hazards.items():
-                    joined = gpd.sjoin(shelter_gdf, hdf, predicate="intersects", how="inner")
-                    if not joined.empty:
-                        rec = joined.iloc[0]
-                        zone = rec.get("FLD_ZONE", "Unknown")
-                        subtype = rec.get("ZONE_SUBTY", "")
-                        sfha_tf = rec.get("SFHA_TF", None)
+            for hname, index in self._hazard_layers_at(row.geometry.y, row.geometry.x).items():
+                with tracing.span("data_agent.hazard_lookup", layer=hname, polygons=len(index)) as s:
+                    hits = index.polygons_at(row.geometry.x, row.geometry.y)
+                    s.set(matches=len(hits))
+                if len(hits):
+                    rec = index.hazards.iloc[index.highest(hits)]
+                    zone = rec.get("FLD_ZONE", "Unknown")
+                    subtype = rec.get("ZONE_SUBTY", "")
+                    sfha_tf = rec.get("SFHA_TF", None)
 
-                        risk = self.classify_flood_risk(zone, subtype, sfha_tf)
+                    risk = self.classify_flood_risk(zone, subtype, sfha_tf)
 
-                        hazards_here.append({
-                            "type": hname,           # e.g., "fema_flood"
-                            "zone": zone,            # e.g., "AE", "VE", "X"
-                            "risk": risk             # e.g., "High", "Moderate", "Low"
-                        })
+                    hazards_here.append({
+                        "type": hname,           # e.g., "fema_flood"
+                        "zone": zone,            # e.g., "AE", "VE", "X"
+                        "risk": risk             # e.g., "High", "Moderate", "Low"
+                    })
 
 
 
@@ -216,10 +303,218 @@ class DataAgent:
         return results
 
     # -------------------------------------------------------------
-    def handle_query(self, lat, lon, state=None):
+    def shelter_index(self):
+        """KD-tree + filter bitmaps over the eagerly loaded shelters (built on first use)."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    with tracing.span("data_agent.build_index", rows=len(self.df)):
+                        bits = compute_filter_bits(
+                            self.df,
+                            [self.hazard_index(name) for name in getattr(self, "hazards", {})],
+                            self.classify_flood_risk,
+                        )
+                        self._index = ShelterIndex(self.df, bits)
+        return self._index
+
+    def _distances(self, df, lat, lon):
+        """Geodesic distance in miles from (lat, lon) to every row of df."""
+        return geodesic_miles(lat, lon, df.geometry.y.to_numpy(), df.geometry.x.to_numpy())
+
+    def _tile_bits(self, frame, tile):
+        """filter_bits of a partition tile (computed here for tiles built before filters existed)."""
+        if "filter_bits" in frame.columns:
+            return frame["filter_bits"].to_numpy()
+        store = self.partitions
+
+        def build():
+            hazards = [store.hazards(layer, *tile) for layer in store.index["hazard_tiles"]]
+            bits = compute_filter_bits(frame, hazards, self.classify_flood_risk)
+            return bits, bits.nbytes
+
+        # cached next to the tile (under the same memory budget) until it is evicted
+        return store.derived(("filter_bits", tile_name(*tile)), build)
+
+    def _block_radius_miles(self, lat, lon, bounds):
+        """
+        Lower bound on the distance from (lat, lon) to the edge of a lat/lon box
+        around it. The nearest point of a parallel is straight north or south
+        (exact geodesic); the nearest point of a meridian lies poleward of lat,
+        so east/west edges use the cross-track distance asin(sin dlon * cos lat)
+        on a sphere of the ellipsoid's smallest radius.
+        """
+        lat_lo, lat_hi, lon_lo, lon_hi = bounds
+        _, _, meters = self.geod.inv([lon] * 2, [lat] * 2, [lon] * 2, [max(lat_lo, -90.0), min(lat_hi, 90.0)])
+        miles = [self._mi(m) for m in meters]
+        cos_lat = math.cos(math.radians(lat))
+        for edge in (lon_lo, lon_hi):
+            dlon = math.radians(min(abs(lon - edge), 90.0))
+            miles.append(math.asin(math.sin(dlon) * cos_lat) * MIN_EARTH_RADIUS_MILES)
+        return min(miles)
+
+    def _partition_candidates(self, lat, lon, limit, state_filter=None, required=0):
+        """
+        Gather shelters from the tiles around (lat, lon), widening one ring of
+        tiles at a time until the limit-th nearest shelter is closer than the
+        edge of the loaded block, so the result matches a full scan (including
+        shelters just across a state line). Filters are applied per tile before
+        distances are computed, and tiles the index says hold no matching
+        shelter are not loaded at all.
+        """
+        store = self.partitions
+        row, col = tile_of(lat, lon, store.tile_deg)
+        # with a state filter, never widen past the tiles holding that state's shelters
+        allowed = store.state_tiles(state_filter) if state_filter else None
+        frames = []
+        found = None
+        rings = 0
+
+        with tracing.span("data_agent.partition_scan", limit=limit) as s:
+            for r in range(store.max_ring(row, col, allowed) + 1):
+                rings = r + 1
+                for tile in store.ring(row, col, r):
+                    if allowed is not None and tile_name(*tile) not in allowed:
+                        continue
+                    if not store.may_match(tile, required):
+                        continue
+                    frame = store.shelters(*tile)
+                    if frame is None:
+                        continue
+                    if required:
+                        frame = frame[matching(self._tile_bits(frame, tile), required)]
+                    if state_filter and "state" in frame.columns:
+                        frame = frame[frame["state"].str.lower() == state_filter.lower()]
+                    if len(frame):
+                        frame = frame.copy()
+                        frame["distance_miles"] = self._distances(frame, lat, lon)
+                        frames.append(frame)
+
+                if not frames:
+                    continue
+                found = pd.concat(frames)
+                distinct = found.sort_values("distance_miles").drop_duplicates(["shelter_na", "city", "state"])
+                if len(distinct) >= limit:
+                    kth = distinct["distance_miles"].iloc[limit - 1]
+                    if kth <= self._block_radius_miles(lat, lon, store.block_bounds(row, col, r)):
+                        break
+            s.set(rings=rings, candidates=0 if found is None else len(found))
+
+        if found is None:
+            empty = pd.Series([], dtype=object)
+            return gpd.GeoDataFrame(
+                {"shelter_na": empty, "city": empty, "state": empty, "distance_miles": pd.Series([], dtype=float)},
+                geometry=[], crs="EPSG:4326",
+            )
+        return found
+
+    def shelter_frame(self, bounds=None):
+        """
+        All shelter records, or those inside bounds = (lat_lo, lat_hi, lon_lo, lon_hi).
+        In partitioned mode only the tiles overlapping bounds are loaded.
+        """
+        if self.partitions is None:
+            df = self.df
+        else:
+            store = self.partitions
+            if bounds is None:
+                names = store.index["shelter_tiles"]
+                tiles = [tuple(int(v) for v in n.split("_")) for n in names]
+            else:
+                r0, c0 = tile_of(bounds[0], bounds[2], store.tile_deg)
+                r1, c1 = tile_of(bounds[1], bounds[3], store.tile_deg)
+                tiles = [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+            frames = [f for f in (store.shelters(*t) for t in tiles) if f is not None]
+            if not frames:
+                return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+            df = gpd.GeoDataFrame(pd.concat(frames), crs="EPSG:4326")
+
+        if bounds is not None:
+            lat_lo, lat_hi, lon_lo, lon_hi = bounds
+            y, x = df.geometry.y, df.geometry.x
+            df = df[(y >= lat_lo) & (y <= lat_hi) & (x >= lon_lo) & (x <= lon_hi)]
+        return df
+
+    def _hazard_layers_at(self, lat, lon):
+        """{layer name: HazardIndex} to look a point up in."""
+        if self.partitions is not None:
+            tile = tile_of(lat, lon, self.partitions.tile_deg)
+            layers = {}
+            for layer, tiles in self.partitions.index["hazard_tiles"].items():
+                if tile_name(*tile) in tiles:
+                    layers[layer] = self.hazard_index(layer, [tile])
+            return layers
+        return {name: self.hazard_index(name) for name in getattr(self, "hazards", {})}
+
+    def flood_mapped(self, lat, lon):
+        """Whether any flood layer covers (lat, lon), i.e. flood_safe means something there."""
+        return any(index.covers([lon], [lat])[0] for index in self._hazard_layers_at(lat, lon).values())
+
+    def hazard_index(self, layer, tiles=None):
+        """
+        HazardIndex (exposure.py) over a hazard layer: the whole layer when
+        loaded eagerly, otherwise the given partition tiles. Built on first
+        use; in partitioned mode it is cached in the PartitionStore, so it
+        counts against the same memory budget as the tiles.
+        """
+        if self.partitions is None:
+            with self._hazard_lock:
+                if layer not in self._hazard_indexes:
+                    frame = self.hazards[layer]
+                    with tracing.span("data_agent.build_hazard_index", layer=layer, polygons=len(frame)):
+                        self._hazard_indexes[layer] = HazardIndex(frame, self.classify_flood_risk)
+                return self._hazard_indexes[layer]
+
+        tiles = tuple(sorted(tiles))
+
+        def build():
+            frames = [f for f in (self.partitions.hazards(layer, *t) for t in tiles) if f is not None]
+            if len(frames) == 1:
+                frame, size = frames[0], 0          # the tile itself, already counted by the store
+            else:
+                frame = (
+                    gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+                    if frames else gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+                )
+                size = frame_bytes(frame)
+            with tracing.span("data_agent.build_hazard_index", layer=layer, polygons=len(frame)):
+                index = HazardIndex(frame, self.classify_flood_risk)
+            return index, size + index.nbytes
+
+        return self.partitions.derived(("hazard_index", layer, tiles), build)
+
+    @tracing.traced("data_agent.route_flood_exposure")
+    def route_flood_exposure(self, path_coords, layer="fema_flood"):
+        """
+        Meters and share of a route ([(lat, lon), ...]) inside each flood risk
+        class, plus where it first enters a high-risk zone (see
+        HazardIndex.route_exposure). None when the layer is not loaded.
+        """
+        if not path_coords:
+            return None
+        if self.partitions is None:
+            if layer not in getattr(self, "hazards", {}):
+                return None
+            tiles = None
+        else:
+            names = self.partitions.index["hazard_tiles"].get(layer)
+            if names is None:
+                return None
+            lats = [p[0] for p in path_coords]
+            lons = [p[1] for p in path_coords]
+            r0, c0 = tile_of(min(lats), min(lons), self.partitions.tile_deg)
+            r1, c1 = tile_of(max(lats), max(lons), self.partitions.tile_deg)
+            tiles = [
+                (r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1) if tile_name(r, c) in names
+            ]
+        index = self.hazard_index(layer, tiles)
+        tracing.current().set(points=len(path_coords), polygons=len(index))
+        return index.route_exposure(path_coords)
+
+    # -------------------------------------------------------------
+    def handle_query(self, lat, lon, state=None, filters=None):
         """Handle a query by coordinates."""
 
-        data = self.get_nearest_shelters(lat, lon, limit=5, state_filter=state)
+        data = self.get_nearest_shelters(lat, lon, limit=5, state_filter=state, filters=filters)
         # print(json.dumps(data, indent=2))
         return data
 
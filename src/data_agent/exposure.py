@@ -0,0 +1,165 @@
+"""
+Flood-zone lookups against a hazard layer through a shapely STRtree.
+
+HazardIndex holds one layer's polygons, a tree over them and each polygon's
+risk class (DataAgent.classify_flood_risk), and answers:
+
+- polygons_at(lon, lat): which polygons contain a shelter point, and
+  highest(positions): the one with the highest class among them;
+- high_risk_at(lons, lats): which points lie in a high-risk zone (filters.py);
+- covers(lons, lats): which points the layer maps at all (filters.py);
+- route_exposure(path): how much of a route runs through each risk class.
+
+For routes, every path segment is matched against the tree in one bulk
+query and clipped to the candidate polygons in one vectorized intersection.
+A clipped piece lies on its segment, so it is kept as an interval of the
+segment (0..1) and scaled by the segment's geodesic length: meters without
+projecting any polygon. Where zones overlap, the stretch counts once, for
+the highest class.
+"""
+from ..lazy import lazy_import
+from .filters import hazard_risk
+from .spatial import geod
+
+np = lazy_import("numpy")
+shapely = lazy_import("shapely")
+
+RISK_ORDER = ("High", "Moderate", "Low", "Unknown")   # highest first
+# coverage grid; a power of two so cells nest exactly in partition tiles
+COVERAGE_DEG = 0.125
+
+
+class HazardIndex:
+
+    def __init__(self, hazards, classify):
+        self.hazards = hazards
+        self.geoms = np.asarray(hazards.geometry.values, dtype=object)
+        self.risk = hazard_risk(hazards, classify)
+        # position in RISK_ORDER, 0 being the highest class
+        self.rank = np.asarray([RISK_ORDER.index(r) for r in self.risk], dtype=int)
+        self.tree = shapely.STRtree(self.geoms)
+        self._cells = None
+
+    def __len__(self):
+        return len(self.geoms)
+
+    @property
+    def nbytes(self):
+        """Rough memory of the index itself (arrays, tree and coverage grid; not the frame)."""
+        # geometry/risk/rank entries ~24 bytes, STRtree ~64 per polygon, ~2 coverage cells of ~100
+        return len(self.geoms) * 288
+
+    def polygons_at(self, lon, lat):
+        """Positions of the polygons containing a point (in tree order)."""
+        return self.tree.query(shapely.Point(lon, lat), predicate="intersects")
+
+    def highest(self, positions):
+        """Position of the highest-class polygon among positions (the first in file order on ties)."""
+        positions = np.sort(positions)
+        return positions[np.argmin(self.rank[positions])]
+
+    def high_risk_at(self, lons, lats):
+        """Bool array: which points lie inside a "High" polygon."""
+        points, polygons = self.tree.query(shapely.points(lons, lats), predicate="intersects")
+        inside = np.zeros(len(lons), dtype=bool)
+        inside[points[self.rank[polygons] == 0]] = True
+        return inside
+
+    def covers(self, lons, lats):
+        """
+        Bool array: which points lie in a COVERAGE_DEG cell that some polygon's
+        bounding box reaches. A flood map covers whole communities, so a mapped
+        point outside every polygon is outside any zone; far from all of them
+        the layer says nothing either way.
+        """
+        if self._cells is None:
+            bounds = shapely.bounds(self.geoms)
+            bounds = np.floor(bounds[np.isfinite(bounds).all(axis=1)] / COVERAGE_DEG).astype(int)
+            self._cells = {
+                (row, col)
+                for c0, r0, c1, r1 in bounds.tolist()
+                for row in range(r0, r1 + 1) for col in range(c0, c1 + 1)
+            }
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        finite = np.isfinite(lats) & np.isfinite(lons)     # a point without coordinates is never covered
+        rows = np.floor(np.where(finite, lats, 0) / COVERAGE_DEG).astype(int)
+        cols = np.floor(np.where(finite, lons, 0) / COVERAGE_DEG).astype(int)
+        return finite & np.asarray([cell in self._cells for cell in zip(rows.tolist(), cols.tolist())], dtype=bool)
+
+    # ---------------------------------------------------------
+    def route_exposure(self, path_coords):
+        """
+        Flood exposure of a route given as [(lat, lon), ...]:
+
+            {"total_m", "unzoned_m", "classes": {risk: {"meters", "share"}},
+             "first_high_risk_entry": {"lat", "lon", "distance_m"} or None}
+        """
+        coords = np.asarray(path_coords, dtype=float).reshape(-1, 2)
+        result = {"total_m": 0.0, "unzoned_m": 0.0, "classes": {}, "first_high_risk_entry": None}
+        if len(coords) < 2:
+            return result
+
+        lonlat = coords[:, ::-1]
+        _, _, seg_m = geod().inv(lonlat[:-1, 0], lonlat[:-1, 1], lonlat[1:, 0], lonlat[1:, 1])
+        seg_m = np.asarray(seg_m)
+        segments = shapely.linestrings(np.stack([lonlat[:-1], lonlat[1:]], axis=1))
+        total = float(seg_m.sum())
+        result["total_m"] = round(total, 1)
+
+        seg_idx, poly_idx = self.tree.query(segments, predicate="intersects")
+        moving = seg_m[seg_idx] > 0                      # repeated points make empty segments
+        seg_idx, poly_idx = seg_idx[moving], poly_idx[moving]
+        if not len(seg_idx):
+            result["unzoned_m"] = result["total_m"]
+            return result
+
+        # clipped pieces as [lo, hi] intervals along their segment (0..1)
+        pieces = shapely.intersection(segments[seg_idx], self.geoms[poly_idx])
+        parts, which = shapely.get_parts(pieces, return_index=True)
+        lines = shapely.get_type_id(parts) == 1        # drop points where a route only touches a zone
+        parts, rows = parts[lines], which[lines]
+        seg = seg_idx[rows]
+        rank = self.rank[poly_idx[rows]]
+        start = shapely.line_locate_point(segments[seg], shapely.get_point(parts, 0), normalized=True)
+        end = shapely.line_locate_point(segments[seg], shapely.get_point(parts, -1), normalized=True)
+        lo, hi = np.minimum(start, end), np.maximum(start, end)
+
+        # pieces of one polygon never overlap, so only segments hit by
+        # several polygons need overlaps resolved
+        covered = np.zeros((len(RISK_ORDER), len(segments)))
+        counts = np.bincount(seg_idx, minlength=len(segments))
+        single = counts[seg] == 1
+        np.add.at(covered, (rank[single], seg[single]), hi[single] - lo[single])
+        for s in np.unique(seg[~single]):
+            own = seg == s
+            covered[:, s] = _highest_class_lengths(lo[own], hi[own], rank[own])
+
+        meters = np.clip(covered, 0.0, 1.0) @ seg_m
+        for level, m in zip(RISK_ORDER, meters):
+            if m > 0:
+                result["classes"][level] = {
+                    "meters": round(float(m), 1),
+                    "share": round(float(m) / total, 4) if total else 0.0,
+                }
+        result["unzoned_m"] = round(max(total - float(meters.sum()), 0.0), 1)
+
+        high = np.flatnonzero(rank == 0)
+        if len(high):
+            # earliest segment first, then earliest point along it
+            first = high[np.lexsort((lo[high], seg[high]))[0]]
+            point = shapely.line_interpolate_point(segments[seg[first]], lo[first], normalized=True)
+            result["first_high_risk_entry"] = {
+                "lat": round(float(point.y), 6),
+                "lon": round(float(point.x), 6),
+                "distance_m": round(float(seg_m[:seg[first]].sum() + lo[first] * seg_m[seg[first]]), 1),
+            }
+        return result
+
+
+def _highest_class_lengths(lo, hi, rank):
+    """Covered length per RISK_ORDER class of one segment, overlaps going to the higher class."""
+    edges = np.unique(np.concatenate([lo, hi]))
+    mids = (edges[:-1] + edges[1:]) / 2
+    covers = (lo[:, None] <= mids) & (hi[:, None] >= mids)
+    best = np.where(covers, rank[:, None], len(RISK_ORDER)).min(axis=0)
+    return np.bincount(best, weights=np.diff(edges), minlength=len(RISK_ORDER) + 1)[:-1]
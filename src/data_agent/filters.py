@@ -0,0 +1,197 @@
+"""
+Attribute filters for nearest-shelter search.
+
+Every shelter gets a small bitmap, filter_bits, computed once per dataset
+(or per partition tile at build time):
+
+    accessible   handicap_accessible is "Yes"
+    pets         pet_accomm is set and not NONE/NO/UNK
+    generator    generator_ is YES
+    open         shelter_st is OPEN
+    flood_safe   mapped by a flood layer and not inside a high-risk
+                 (A/V zone) polygon of it
+
+A shelter no flood layer covers is not flood_safe: the layer cannot tell.
+When the search location itself is unmapped, DataAgent drops the filter
+and reports it under "unavailable_filters" instead.
+
+A query's filters become one required mask, so matching is a single
+vectorized `(bits & mask) == mask` applied *before* any distance work
+(filter pushdown). ShelterIndex then widens a KD-tree search until enough
+matching shelters are found, or scans the matching subset directly when a
+filter is rare, so filtered queries cost about the same as unfiltered ones.
+"""
+from ..lazy import lazy_import
+from .spatial import PointIndex, geodesic_miles
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+FILTER_BITS = {
+    "accessible": 1,
+    "pets": 2,
+    "generator": 4,
+    "open": 8,
+    "flood_safe": 16,
+}
+
+YES_VALUES = {"YES", "Y", "TRUE", "T", "1"}
+NO_PET_VALUES = {"", "NONE", "NO", "N", "UNK", "UNKNOWN", "NAN", "FALSE", "0"}
+
+
+def filter_mask(filters):
+    """Required bitmask for filter names (None or empty means no filter)."""
+    if not filters:
+        return 0
+    if isinstance(filters, str):
+        filters = [filters]
+    unknown = sorted(set(filters) - set(FILTER_BITS))
+    if unknown:
+        raise ValueError(f"Unknown shelter filter(s) {unknown}; choose from {sorted(FILTER_BITS)}")
+    mask = 0
+    for name in filters:
+        mask |= FILTER_BITS[name]
+    return mask
+
+
+def filter_names(mask):
+    return [name for name, bit in FILTER_BITS.items() if mask & bit]
+
+
+def _upper(frame, column):
+    if column not in frame.columns:
+        return pd.Series("", index=frame.index)
+    return frame[column].fillna("").astype(str).str.strip().str.upper()
+
+
+def hazard_risk(hazards, classify):
+    """Risk class ("High", "Moderate", ...) of every polygon in a FEMA flood frame."""
+    def column(name):
+        return hazards[name] if name in hazards.columns else pd.Series(None, index=hazards.index, dtype=object)
+    return np.asarray([
+        classify(zone, subtype, sfha)
+        for zone, subtype, sfha in zip(column("FLD_ZONE"), column("ZONE_SUBTY"), column("SFHA_TF"))
+    ], dtype=object)
+
+
+def _hazard_indexes(hazard_frames, classify):
+    """exposure.HazardIndex per non-empty layer; HazardIndex objects are reused as they are."""
+    from .exposure import HazardIndex
+
+    return [
+        hazards if isinstance(hazards, HazardIndex) else HazardIndex(hazards, classify)
+        for hazards in hazard_frames
+        if hazards is not None and len(hazards)
+    ]
+
+
+def high_flood_risk(frame, hazard_frames, classify):
+    """
+    Bool array: shelter point lies inside a polygon that classify() rates "High".
+    hazard_frames may hold exposure.HazardIndex objects instead of frames, whose
+    trees are then reused.
+    """
+    inside = np.zeros(len(frame), dtype=bool)
+    lons, lats = frame.geometry.x.to_numpy(), frame.geometry.y.to_numpy()
+    for index in _hazard_indexes(hazard_frames, classify):
+        inside |= index.high_risk_at(lons, lats)
+    return inside
+
+
+def compute_filter_bits(frame, hazard_frames=(), classify=None):
+    """uint8 filter bitmap per row of a shelter frame."""
+    bits = np.zeros(len(frame), dtype=np.uint8)
+    if not len(frame):
+        return bits
+    bits |= np.where(_upper(frame, "handicap_accessible").eq("YES"), FILTER_BITS["accessible"], 0).astype(np.uint8)
+    if "pet_accomm" in frame.columns:
+        bits |= np.where(~_upper(frame, "pet_accomm").isin(NO_PET_VALUES), FILTER_BITS["pets"], 0).astype(np.uint8)
+    bits |= np.where(_upper(frame, "generator_").isin(YES_VALUES), FILTER_BITS["generator"], 0).astype(np.uint8)
+    bits |= np.where(_upper(frame, "shelter_st").eq("OPEN"), FILTER_BITS["open"], 0).astype(np.uint8)
+    if classify:
+        lons, lats = frame.geometry.x.to_numpy(), frame.geometry.y.to_numpy()
+        covered = np.zeros(len(frame), dtype=bool)
+        flooded = np.zeros(len(frame), dtype=bool)
+        for index in _hazard_indexes(hazard_frames, classify):
+            covered |= index.covers(lons, lats)
+            flooded |= index.high_risk_at(lons, lats)
+        bits |= np.where(covered & ~flooded, FILTER_BITS["flood_safe"], 0).astype(np.uint8)
+    return bits
+
+
+def matching(bits, required):
+    return (bits & required) == required
+
+
+def dedup_keys(frame):
+    """name|city|state key used to collapse duplicate shelter records."""
+    def norm(column):
+        if column not in frame.columns:
+            return pd.Series("", index=frame.index)
+        return frame[column].fillna("").astype(str).str.strip().str.lower()
+    return (norm("shelter_na") + "|" + norm("city") + "|" + norm("state")).to_numpy()
+
+
+# -------------------------------------------------------------
+class ShelterIndex:
+    """KD-tree over a shelter frame plus per-row filter bits, state codes and dedup keys."""
+
+    def __init__(self, frame, bits, scan_below=4096):
+        self.frame = frame
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.points = PointIndex(frame.geometry.y.to_numpy(), frame.geometry.x.to_numpy())
+        self.keys = dedup_keys(frame)
+        states = _upper(frame, "state")
+        self.state_codes, uniques = pd.factorize(states)
+        self.state_lookup = {s: i for i, s in enumerate(uniques)}
+        # matching sets smaller than this are scanned directly instead of through the tree
+        self.scan_below = scan_below
+
+    def mask(self, required=0, state=None):
+        """Rows passing the filters and the state, or None when nothing is filtered."""
+        # rows without usable coordinates can never be returned
+        mask = None if self.points.valid.all() else self.points.valid
+        if required:
+            mask = matching(self.bits, required) if mask is None else mask & matching(self.bits, required)
+        if state:
+            code = self.state_lookup.get(str(state).strip().upper(), -2)
+            state_mask = self.state_codes == code
+            mask = state_mask if mask is None else mask & state_mask
+        return mask
+
+    def nearest(self, lat, lon, k, required=0, state=None):
+        """
+        Candidate rows (positions, geodesic miles) guaranteed to contain the
+        k nearest distinct shelters that pass the filters and the state.
+        """
+        mask = self.mask(required, state)
+        n = len(self.points)
+        n_match = n if mask is None else int(mask.sum())
+        if n_match == 0:
+            return np.zeros(0, dtype=int), np.zeros(0)
+
+        if mask is not None and n_match <= self.scan_below:
+            positions = np.flatnonzero(mask)
+            return positions, geodesic_miles(lat, lon, self.points.lat[positions], self.points.lon[positions])
+
+        # widen the tree search until k distinct matches are in hand
+        want = min(max(4 * k, 16), n)
+        while True:
+            found = self.points.query(lat, lon, want)[0]
+            found = found[found >= 0]
+            if mask is not None:
+                found = found[mask[found]]
+            if len(np.unique(self.keys[found])) >= k or want >= n:
+                break
+            want = min(want * 4, n)
+
+        # KD order is spherical; pull in everything that could beat the k-th match on the ellipsoid
+        miles = geodesic_miles(lat, lon, self.points.lat[found], self.points.lon[found])
+        order = np.argsort(miles, kind="stable")
+        _, first = np.unique(self.keys[found[order]], return_index=True)
+        kth = np.sort(miles[order][first])[:k][-1] if len(first) else 0.0
+        positions = self.points.within_miles(lat, lon, kth)
+        if mask is not None:
+            positions = positions[mask[positions]]
+        positions = np.union1d(positions, found)
+        return positions, geodesic_miles(lat, lon, self.points.lat[positions], self.points.lon[positions])
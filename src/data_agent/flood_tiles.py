@@ -0,0 +1,224 @@
+"""
+Pre-rendered map tiles for the flood-zone overlay in the Streamlit map.
+
+Handing folium tens of thousands of raw FEMA polygons as GeoJSON freezes the
+browser and is re-sent on every rerun. Instead the flood layer is rendered
+once, offline, into standard XYZ (Web Mercator) PNG tiles:
+
+    <out_dir>/index.json
+    <out_dir>/<z>/<x>/<y>.png
+
+Polygons are coloured by DataAgent.classify_flood_risk (higher classes drawn
+over lower ones) and simplified per zoom to half a pixel, and only tiles
+with something on them are written. The map then fetches just the tiles in
+its viewport from a small local tile server (serve_tiles), so it loads in
+the same time however large the hazard layer is; missing tiles come back as
+a transparent image.
+
+Build (needs Pillow, which Streamlit already installs):
+    python -m src.data_agent.flood_tiles --base-path src/data_agent/data
+"""
+import os
+import re
+import json
+import glob
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ..lazy import lazy_import
+from .filters import hazard_risk
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+shapely = lazy_import("shapely")
+
+INDEX_FILE = "index.json"
+TILE_PX = 256
+WORLD_M = 2 * 20037508.342789244     # width of the Web Mercator square in meters
+DEFAULT_ZOOMS = (8, 14)
+
+# RGBA per risk class, listed from the bottom of the drawing order to the top
+CLASS_COLORS = {
+    "Low": (31, 119, 180, 60),
+    "Moderate": (255, 160, 0, 130),
+    "High": (214, 39, 40, 160),
+}
+
+# 1x1 transparent PNG for tiles with no flood zone (Leaflet stretches it)
+EMPTY_TILE = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4"
+    b"\x89\x00\x00\x00\rIDATx\xdac````\x00\x00\x00\x05\x00\x01z\xa8WP\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+def default_hazard_path(base_path):
+    return os.path.join(base_path, "hazards", "floods", "CT_Flood_Zones.shp")
+
+
+def find_flood_tiles(base_path):
+    """Default flood tile directory for a data folder, if one has been built."""
+    path = os.path.join(base_path, "flood_tiles")
+    return path if os.path.exists(os.path.join(path, INDEX_FILE)) else None
+
+
+def _tile_range(lo, hi, zoom):
+    """Tile columns (x) or rows (y, when given flipped coordinates) covering [lo, hi] meters."""
+    n = 2 ** zoom
+    size = WORLD_M / n
+    first = np.clip(np.floor((lo + WORLD_M / 2) / size).astype(int), 0, n - 1)
+    last = np.clip(np.floor((hi + WORLD_M / 2) / size).astype(int), 0, n - 1)
+    return first, last
+
+
+def _render(geoms, classes, left, top, res):
+    """RGBA tile image for clipped polygons (Web Mercator), or None when nothing shows."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGBA", (TILE_PX, TILE_PX), (0, 0, 0, 0))
+    drawn = False
+    for level, color in CLASS_COLORS.items():
+        mask = Image.new("L", (TILE_PX, TILE_PX), 0)
+        draw = ImageDraw.Draw(mask)
+        for geom in geoms[classes == level]:
+            for polygon in shapely.get_parts(geom):
+                if shapely.get_type_id(polygon) != 3:      # clipping can leave lines or points
+                    continue
+                rings = [polygon.exterior, *polygon.interiors]
+                for i, ring in enumerate(rings):
+                    xy = (np.asarray(ring.coords) - (left, top)) / (res, -res)
+                    if len(xy) >= 3:
+                        draw.polygon(xy.ravel().tolist(), fill=0 if i else 255)
+        if mask.getbbox():
+            image.paste(Image.new("RGBA", (TILE_PX, TILE_PX), color), (0, 0), mask)
+            drawn = True
+    return image if drawn else None
+
+
+def build_flood_tiles(hazards, out_dir, classify, min_zoom=DEFAULT_ZOOMS[0], max_zoom=DEFAULT_ZOOMS[1]):
+    """
+    Render a flood hazard frame (any CRS) into <out_dir>/<z>/<x>/<y>.png for
+    every zoom in [min_zoom, max_zoom]; returns the index written to index.json.
+    """
+    risk = hazard_risk(hazards, classify)
+    shown = np.isin(risk, list(CLASS_COLORS))
+    mercator = hazards[shown].to_crs("EPSG:3857")
+    geoms = np.asarray(shapely.make_valid(mercator.geometry.values), dtype=object)
+    risk = risk[shown]
+    lon_lo, lat_lo, lon_hi, lat_hi = hazards[shown].to_crs("EPSG:4326").total_bounds
+
+    written = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        res = WORLD_M / (2 ** zoom * TILE_PX)    # meters per pixel
+        simple = shapely.simplify(geoms, res / 2, preserve_topology=True)
+        # polygons under a quarter pixel would not change any pixel
+        keep = shapely.area(simple) >= res * res / 4
+        simple, classes = simple[keep], risk[keep]
+        tree = shapely.STRtree(simple)
+
+        bounds = shapely.bounds(simple)
+        x0, x1 = _tile_range(bounds[:, 0], bounds[:, 2], zoom)
+        y0, y1 = _tile_range(-bounds[:, 3], -bounds[:, 1], zoom)
+        tiles = {
+            (x, y)
+            for a, b, c, d in zip(x0, x1, y0, y1)
+            for x in range(a, b + 1) for y in range(c, d + 1)
+        }
+
+        # a rebuild must not leave tiles behind that are empty now
+        shutil.rmtree(os.path.join(out_dir, str(zoom)), ignore_errors=True)
+        count = 0
+        size = WORLD_M / 2 ** zoom
+        pad = res                             # one pixel beyond the edge keeps borders clean
+        for x, y in sorted(tiles):
+            left, top = -WORLD_M / 2 + x * size, WORLD_M / 2 - y * size
+            box = (left - pad, top - size - pad, left + size + pad, top + pad)
+            ids = tree.query(shapely.box(*box), predicate="intersects")
+            if not len(ids):
+                continue
+            image = _render(shapely.clip_by_rect(simple[ids], *box), classes[ids], left, top, res)
+            if image is None:
+                continue
+            os.makedirs(os.path.join(out_dir, str(zoom), str(x)), exist_ok=True)
+            image.save(os.path.join(out_dir, str(zoom), str(x), f"{y}.png"))
+            count += 1
+        written[str(zoom)] = count
+        print(f"Zoom {zoom}: wrote {count} tiles from {len(simple)} polygons.")
+
+    index = {
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "bounds": [float(lat_lo), float(lat_hi), float(lon_lo), float(lon_hi)],
+        "classes": {level: list(color) for level, color in CLASS_COLORS.items()},
+        "tiles": written,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+# -------------------------------------------------------------
+class _TileHandler(BaseHTTPRequestHandler):
+    PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+    def do_GET(self):
+        match = self.PATH.match(self.path.split("?", 1)[0])
+        if not match:
+            self.send_error(404)
+            return
+        path = os.path.join(self.server.tile_dir, *match.groups()[:2], f"{match.group(3)}.png")
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            body = EMPTY_TILE
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_tiles(tile_dir, host="127.0.0.1", port=0):
+    """
+    Serve tile_dir as <url>/<z>/<x>/<y>.png from a background thread.
+    Returns (server, base url); server.shutdown() stops it.
+    """
+    server = ThreadingHTTPServer((host, port), _TileHandler)
+    server.daemon_threads = True
+    server.tile_dir = tile_dir
+    threading.Thread(target=server.serve_forever, daemon=True, name="flood-tiles").start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    from .data_agent import DataAgent
+
+    parser = argparse.ArgumentParser(description="Render flood zones into XYZ map tiles for the Streamlit map.")
+    parser.add_argument("--base-path", default="src/data_agent/data")
+    parser.add_argument("--out", help="output directory (default <base-path>/flood_tiles)")
+    parser.add_argument("--hazards", nargs="*", help="flood shapefiles or glob patterns (default: the CT layer)")
+    parser.add_argument("--min-zoom", type=int, default=DEFAULT_ZOOMS[0])
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_ZOOMS[1])
+    args = parser.parse_args()
+
+    paths = sorted(p for pattern in args.hazards or [] for p in glob.glob(pattern))
+    paths = paths or [default_hazard_path(args.base_path)]
+    frames = [gpd.read_file(p).to_crs("EPSG:4326") for p in paths]
+    hazards = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+    build_flood_tiles(
+        hazards,
+        args.out or os.path.join(args.base_path, "flood_tiles"),
+        DataAgent.classify_flood_risk,
+        min_zoom=args.min_zoom,
+        max_zoom=args.max_zoom,
+    )
@@ -0,0 +1,320 @@
+"""
+Spatially partitioned shelter and hazard data for nationwide coverage.
+
+The national shelter file and every state's flood layer are cut once, offline,
+into fixed lat/lon tiles (1 degree by default) and pickled per tile:
+
+    <out_dir>/index.json
+    <out_dir>/shelters/<row>_<col>.pkl
+    <out_dir>/hazards/<layer>/<row>_<col>.pkl
+
+At query time DataAgent only loads the tiles around the query point (widening
+ring by ring until the nearest shelters are provably inside the loaded area,
+so neighbours across state lines are found), and keeps loaded tiles in an LRU
+bounded by a memory budget.
+
+Build:
+    python -m src.data_agent.partitions --base-path src/data_agent/data \
+        --hazards "src/data_agent/data/hazards/floods/*_Flood_Zones.shp"
+"""
+import os
+import json
+import math
+import glob
+import threading
+from collections import OrderedDict
+from .. import tracing
+from ..lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+shapely = lazy_import("shapely")
+
+INDEX_FILE = "index.json"
+DEFAULT_TILE_DEG = 1.0
+
+
+def tile_of(lat, lon, tile_deg):
+    return math.floor(lat / tile_deg), math.floor(lon / tile_deg)
+
+
+def tile_name(row, col):
+    return f"{row}_{col}"
+
+
+def frame_bytes(frame):
+    """Rough in-memory size of a (Geo)DataFrame, including geometry coordinates."""
+    size = int(frame.drop(columns="geometry", errors="ignore").memory_usage(deep=True).sum())
+    if "geometry" in frame.columns and len(frame):
+        # shapely objects: ~16 bytes per coordinate plus per-object overhead
+        size += int(shapely.get_num_coordinates(frame.geometry.values).sum()) * 16
+        size += len(frame) * 100
+    return size
+
+
+# -------------------------------------------------------------
+def _write_tiles(frame, rows, cols, out_dir):
+    """Pickle frame rows grouped by (rows, cols) tile; returns {tile: count}."""
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    keys = pd.Series(list(zip(rows, cols)), index=frame.index)
+    for (row, col), idx in keys.groupby(keys).groups.items():
+        name = tile_name(row, col)
+        part = frame.loc[idx]
+        part.to_pickle(os.path.join(out_dir, f"{name}.pkl"))
+        counts[name] = len(part)
+    return counts
+
+
+def _explode_to_tiles(hazards, tile_deg):
+    """Repeat each polygon once per tile its bounding box touches."""
+    bounds = shapely.bounds(hazards.geometry.values)
+    r0 = np.floor(bounds[:, 1] / tile_deg).astype(int)
+    r1 = np.floor(bounds[:, 3] / tile_deg).astype(int)
+    c0 = np.floor(bounds[:, 0] / tile_deg).astype(int)
+    c1 = np.floor(bounds[:, 2] / tile_deg).astype(int)
+
+    positions, rows, cols = [], [], []
+    for pos in range(len(hazards)):
+        for row in range(r0[pos], r1[pos] + 1):
+            for col in range(c0[pos], c1[pos] + 1):
+                positions.append(pos)
+                rows.append(row)
+                cols.append(col)
+
+    exploded = hazards.iloc[positions].reset_index(drop=True)
+    return exploded, rows, cols
+
+
+def build_partitions(agent, out_dir, hazard_paths=None, tile_deg=DEFAULT_TILE_DEG):
+    """
+    Cut an eagerly loaded DataAgent's shelters (and hazard layers) into tiles.
+
+    hazard_paths: flood shapefiles to partition (e.g. one per state). Defaults
+    to the agent's own loaded fema_flood layer.
+    """
+    if hazard_paths:
+        layers = {"fema_flood": [gpd.read_file(p).to_crs("EPSG:4326") for p in hazard_paths]}
+    elif hasattr(agent, "hazards"):
+        layers = {name: [frame] for name, frame in agent.hazards.items()}
+    else:
+        layers = {}
+
+    # filter bitmaps (see filters.py) against every hazard layer being partitioned
+    from .filters import compute_filter_bits
+    shelters = agent.df.copy()
+    shelters["filter_bits"] = compute_filter_bits(
+        shelters, [f for frames in layers.values() for f in frames], agent.classify_flood_risk
+    )
+
+    rows = np.floor(shelters.geometry.y.values / tile_deg).astype(int)
+    cols = np.floor(shelters.geometry.x.values / tile_deg).astype(int)
+    shelter_tiles = _write_tiles(shelters, rows, cols, os.path.join(out_dir, "shelters"))
+    print(f"Wrote {len(shelters)} shelters into {len(shelter_tiles)} tiles.")
+
+    # distinct bitmaps per tile, so filtered searches can skip tiles without a match
+    keys = [tile_name(r, c) for r, c in zip(rows, cols)]
+    shelter_tile_bits = (
+        pd.Series(shelters["filter_bits"].to_numpy(), index=keys)
+        .groupby(level=0).agg(lambda v: sorted(int(b) for b in set(v))).to_dict()
+    )
+
+    # which tiles hold each state's shelters, so state-filtered searches stay inside them
+    state_tiles = {}
+    if "state" in shelters.columns:
+        states = shelters["state"].fillna("").astype(str).str.strip().str.upper().to_numpy()
+        state_tiles = (
+            pd.Series(keys).groupby(states).agg(lambda v: sorted(set(v))).to_dict()
+        )
+
+    hazard_tiles = {}
+    for layer, frames in layers.items():
+        hazards = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+        exploded, rows, cols = _explode_to_tiles(hazards, tile_deg)
+        hazard_tiles[layer] = _write_tiles(exploded, rows, cols, os.path.join(out_dir, "hazards", layer))
+        print(f"Wrote {len(hazards)} {layer} polygons into {len(hazard_tiles[layer])} tiles.")
+
+    index = {
+        "tile_deg": tile_deg,
+        "shelter_tiles": shelter_tiles,
+        "shelter_tile_bits": shelter_tile_bits,
+        "state_tiles": state_tiles,
+        "hazard_tiles": hazard_tiles,
+    }
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+# -------------------------------------------------------------
+class PartitionStore:
+    """Loads tiles on demand and keeps them in an LRU under a memory budget."""
+
+    def __init__(self, path, memory_budget_mb=512):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.tile_deg = self.index["tile_deg"]
+        self.budget_bytes = int(memory_budget_mb * 2**20)
+
+        self._cache = OrderedDict()   # (kind, name) -> (frame, bytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        names = list(self.index["shelter_tiles"])
+        for tiles in self.index["hazard_tiles"].values():
+            names += list(tiles)
+        rc = np.array([[int(v) for v in n.split("_")] for n in names]) if names else np.zeros((1, 2), int)
+        self.row_range = (int(rc[:, 0].min()), int(rc[:, 0].max()))
+        self.col_range = (int(rc[:, 1].min()), int(rc[:, 1].max()))
+
+    @property
+    def shelter_count(self):
+        return sum(self.index["shelter_tiles"].values())
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key][0]
+        return None
+
+    def _put(self, key, value, size):
+        """Cache value (size bytes) and return the cached copy for key."""
+        with self._lock:
+            self.misses += 1
+            if key not in self._cache:
+                self._cache[key] = (value, size)
+                self.bytes += size
+            value = self._cache[key][0]
+            # evict least recently used entries, but never the one just added
+            while self.bytes > self.budget_bytes and len(self._cache) > 1:
+                _, (_, old_size) = self._cache.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+        return value
+
+    def _get(self, kind, name, file_path):
+        key = (kind, name)
+        frame = self._lookup(key)
+        if frame is not None:
+            tracing.current().incr("tile_cache_hits")
+            return frame
+        frame = pd.read_pickle(file_path)
+        tracing.current().incr("tiles_loaded")
+        return self._put(key, frame, frame_bytes(frame))
+
+    def derived(self, key, build):
+        """
+        Something computed from tiles (a hazard index, filter bits), built once
+        by build() -> (value, bytes) and kept in the same LRU and memory budget
+        as the tiles themselves.
+        """
+        value = self._lookup(key)
+        if value is None:
+            value = self._put(key, *build())
+        return value
+
+    def shelters(self, row, col):
+        name = tile_name(row, col)
+        if name not in self.index["shelter_tiles"]:
+            return None
+        return self._get("shelters", name, os.path.join(self.path, "shelters", f"{name}.pkl"))
+
+    def may_match(self, tile, required):
+        """False only if the index proves no shelter in tile passes the required filter bits."""
+        if not required:
+            return True
+        combos = self.index.get("shelter_tile_bits", {}).get(tile_name(*tile))
+        if combos is None:
+            return True
+        return any(b & required == required for b in combos)
+
+    def hazards(self, layer, row, col):
+        name = tile_name(row, col)
+        if name not in self.index["hazard_tiles"].get(layer, {}):
+            return None
+        return self._get(layer, name, os.path.join(self.path, "hazards", layer, f"{name}.pkl"))
+
+    # ---------------------------------------------------------
+    def ring(self, row, col, r):
+        """Tiles at Chebyshev distance exactly r from (row, col)."""
+        if r == 0:
+            return [(row, col)]
+        tiles = []
+        for dr in range(-r, r + 1):
+            for dc in range(-r, r + 1):
+                if max(abs(dr), abs(dc)) == r:
+                    tiles.append((row + dr, col + dc))
+        return tiles
+
+    def block_bounds(self, row, col, r):
+        """(lat_lo, lat_hi, lon_lo, lon_hi) of the square of tiles within ring r."""
+        d = self.tile_deg
+        return (row - r) * d, (row + r + 1) * d, (col - r) * d, (col + r + 1) * d
+
+    def max_ring(self, row, col, names=None):
+        """Smallest ring that covers every tile in the index (or every tile in names; -1 if empty)."""
+        if names is None:
+            row_range, col_range = self.row_range, self.col_range
+        elif not names:
+            return -1
+        else:
+            rc = np.array([[int(v) for v in n.split("_")] for n in names])
+            row_range = (int(rc[:, 0].min()), int(rc[:, 0].max()))
+            col_range = (int(rc[:, 1].min()), int(rc[:, 1].max()))
+        return max(
+            abs(row - row_range[0]), abs(row - row_range[1]),
+            abs(col - col_range[0]), abs(col - col_range[1]),
+        )
+
+    def state_tiles(self, state):
+        """Names of the tiles holding a state's shelters; None when unknown (older index)."""
+        tiles = self.index.get("state_tiles")
+        if tiles is None:
+            return None
+        return set(tiles.get(str(state).strip().upper(), []))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tiles_cached": len(self._cache),
+                "cached_mb": round(self.bytes / 2**20, 2),
+                "budget_mb": round(self.budget_bytes / 2**20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def find_partitions(base_path):
+    """Default partition directory for a data folder, if one has been built."""
+    path = os.path.join(base_path, "partitions")
+    return path if os.path.exists(os.path.join(path, INDEX_FILE)) else None
+
+
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    from .data_agent import DataAgent
+
+    parser = argparse.ArgumentParser(description="Partition shelter and flood data into lat/lon tiles.")
+    parser.add_argument("--base-path", default="src/data_agent/data")
+    parser.add_argument("--out", help="output directory (default <base-path>/partitions)")
+    parser.add_argument("--hazards", nargs="*", help="flood shapefiles or glob patterns (default: the loaded CT layer)")
+    parser.add_argument("--tile-deg", type=float, default=DEFAULT_TILE_DEG)
+    args = parser.parse_args()
+
+    hazard_paths = sorted(p for pattern in args.hazards or [] for p in glob.glob(pattern))
+    agent = DataAgent(base_path=args.base_path, partitions=False)
+    build_partitions(
+        agent,
+        args.out or os.path.join(args.base_path, "partitions"),
+        hazard_paths=hazard_paths or None,
+        tile_deg=args.tile_deg,
+    )
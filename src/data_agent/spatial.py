@@ -0,0 +1,92 @@
+from ..lazy import lazy_import
+
+np = lazy_import("numpy")
+pyproj = lazy_import("pyproj")
+scipy_spatial = lazy_import("scipy.spatial")
+
+METERS_PER_MILE = 1609.34
+# smallest radius of curvature of the WGS84 ellipsoid (meridian at the equator)
+MIN_EARTH_RADIUS_MILES = 6335439 / METERS_PER_MILE
+
+_geod = None
+
+
+def geod():
+    """Shared WGS84 Geod (created on first use)."""
+    global _geod
+    if _geod is None:
+        _geod = pyproj.Geod(ellps="WGS84")
+    return _geod
+
+
+def unit_xyz(lat, lon):
+    """Lat/lon (degrees) to points on the unit sphere; chord order = great-circle order."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def geodesic_miles(lat1, lon1, lat2, lon2):
+    """Vectorized WGS84 geodesic distance in miles (arrays broadcast)."""
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, float), np.asarray(lon1, float),
+        np.asarray(lat2, float), np.asarray(lon2, float),
+    )
+    _, _, meters = geod().inv(lon1.ravel(), lat1.ravel(), lon2.ravel(), lat2.ravel())
+    return np.asarray(meters).reshape(lat1.shape) / METERS_PER_MILE
+
+
+class PointIndex:
+    """
+    k-nearest-neighbour index over lat/lon points (KD-tree on the unit sphere).
+
+    Points with a missing or non-finite coordinate are left out of the tree
+    (`valid` marks the ones that are in it); positions returned always refer
+    to the input arrays.
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.valid = np.isfinite(self.lat) & np.isfinite(self.lon)
+        self.positions = np.flatnonzero(self.valid)
+        self.tree = (
+            scipy_spatial.cKDTree(unit_xyz(self.lat[self.positions], self.lon[self.positions]))
+            if len(self.positions) else None
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query(self, lat, lon, k):
+        """
+        Positions of the k nearest points to each query, ordered by distance.
+        Returns an (n, k) int array; missing neighbours (k > number of valid
+        points, or a non-finite query) are -1.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if self.tree is None or k <= 0:
+            return np.full((len(lat), max(k, 0)), -1, dtype=int)
+
+        idx = np.full((len(lat), k), -1, dtype=int)
+        ok = np.isfinite(lat) & np.isfinite(lon)
+        if ok.any():
+            _, found = self.tree.query(unit_xyz(lat[ok], lon[ok]), k=k)
+            found = np.asarray(found).reshape(-1, k)
+            idx[ok] = np.append(self.positions, -1)[found]       # the tree pads missing neighbours with its size
+        return idx
+
+    def within_miles(self, lat, lon, miles):
+        """
+        Positions of every point whose geodesic distance from (lat, lon) may be
+        at most `miles` (a superset: the sphere radius used is the ellipsoid's
+        smallest, so no point within the distance is missed).
+        """
+        if self.tree is None or not np.isfinite([lat, lon, miles]).all():
+            return np.zeros(0, dtype=int)
+        angle = min(miles / MIN_EARTH_RADIUS_MILES, np.pi)
+        chord = 2 * np.sin(angle / 2)
+        found = self.tree.query_ball_point(unit_xyz(lat, lon)[0], chord * (1 + 1e-9))
+        return self.positions[np.asarray(found, dtype=int)]
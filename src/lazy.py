@@ -0,0 +1,58 @@
+"""
+Deferred imports for heavy third-party modules.
+
+geopandas, pandas, shapely, pyproj, ollama and requests together take about
+a second to import, which used to dominate a one-off CLI query (and
+`main.py --client` needs none of them). Modules on the CLI path bind them
+through lazy_import instead:
+
+    gpd = lazy_import("geopandas")
+    gpd.read_file(...)          # geopandas is imported here, on first use
+
+The proxy imports the real module on first attribute access and then
+behaves like it. Avoid touching lazy modules at import time (class bodies,
+default arguments, evaluated annotations), or the import happens anyway.
+Check with:  python main.py --importtime
+"""
+import sys
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name):
+    """The module itself if it is already imported, otherwise a LazyModule."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
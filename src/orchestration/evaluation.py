@@ -0,0 +1,300 @@
+"""
+Concurrent, resumable evaluation of the query classifier (interpret_query).
+
+Labelled cases are read from a JSONL file, one case per line:
+
+    {"id": "nearest-1", "query": "Where are the nearest disaster shelters?",
+     "desired": [[true, false]], "acceptable": [[true, true]], "trials": 10}
+
+Trials run concurrently (--concurrency). Every finished trial is appended to
+a checkpoint file, so an interrupted run resumes where it stopped (records
+are tagged with model and seed; a run with other settings ignores them). LLM
+responses are cached by (model, prompt hash, seed), so re-running after an
+unrelated change costs no LLM calls at all. Ollama only serves requests in
+parallel when started with OLLAMA_NUM_PARALLEL > 1.
+
+    python -m src.orchestration.evaluation --cases src/orchestration/eval_cases.jsonl --concurrency 8
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .orchestration import build_classification_prompt, parse_classification, get_response
+from ..benchmark.stats import summarize_latencies
+
+DEFAULT_MODEL = "llama3.1:8b"
+
+
+# -------------------------------------------------------------
+def load_cases(path):
+    cases = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            case = json.loads(line)
+            case.setdefault("id", hashlib.sha1(case["query"].encode()).hexdigest()[:12])
+            case.setdefault("acceptable", [])
+            case.setdefault("trials", 1)
+            cases.append(case)
+
+    ids = [c["id"] for c in cases]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"Duplicate case ids in {path}")
+    return cases
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def _read_jsonl(path):
+    records = []
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a run killed mid-write leaves a partial last line
+                    continue
+    return records
+
+
+class _JsonlAppender:
+    """Thread-safe, line-buffered JSONL writer (None path = in-memory only)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.f = open(path, "a") if path else None
+
+    def append(self, record):
+        if not self.f:
+            return
+        with self.lock:
+            self.f.write(json.dumps(record) + "\n")
+            self.f.flush()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+class ResponseCache:
+    """LLM responses keyed by model + prompt hash + seed, persisted as JSONL."""
+
+    def __init__(self, path=None):
+        self.entries = {r["key"]: r["response"] for r in _read_jsonl(path)}
+        self.writer = _JsonlAppender(path)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model, phash, seed):
+        return f"{model}|{phash}|{seed}"
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = response
+        self.writer.append({"key": key, "response": response})
+
+
+# -------------------------------------------------------------
+def run_trial(case, trial, cache, model=DEFAULT_MODEL, seed=0):
+    """Classify one case once; returns the checkpoint record."""
+    prompt = build_classification_prompt(case["query"])
+    phash = prompt_hash(prompt)
+    trial_seed = seed + trial
+    key = cache.key(model, phash, trial_seed)
+
+    record = {
+        "case_id": case["id"],
+        "trial": trial,
+        "prompt_hash": phash,
+        "model": model,
+        "seed": trial_seed,
+        "output": None,
+        "error": "",
+    }
+
+    raw = cache.get(key)
+    record["cached"] = raw is not None
+    t0 = time.perf_counter()
+    if raw is None:
+        try:
+            raw = get_response(prompt, model=model, seed=trial_seed)
+        except Exception as e:
+            # transport failure, not a classifier mistake: retried on resume
+            record["error"] = f"{type(e).__name__}: {e}"
+            record["failed"] = True
+            record["latency_s"] = round(time.perf_counter() - t0, 4)
+            return record
+        cache.put(key, raw)
+    try:
+        output, _, error = parse_classification(raw)
+        record["output"] = output
+        record["error"] = error
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_s"] = round(time.perf_counter() - t0, 4)
+    return record
+
+
+def run_eval(cases, concurrency=4, checkpoint_path=None, cache_path=None,
+             model=DEFAULT_MODEL, seed=0, progress=True):
+    """
+    Run every (case, trial) not already in the checkpoint and return the report.
+
+    Checkpoint records are matched on case id, trial, prompt hash, model and
+    seed, so editing the classification prompt automatically re-runs affected
+    trials, and a run with another model or seed never reuses these results.
+    """
+    by_id = {c["id"]: c for c in cases}
+    current_hash = {c["id"]: prompt_hash(build_classification_prompt(c["query"])) for c in cases}
+
+    done = {}
+    for r in _read_jsonl(checkpoint_path):
+        if (
+            r.get("case_id") in by_id
+            and r.get("prompt_hash") == current_hash[r["case_id"]]
+            and r.get("model") == model
+            and r.get("seed") == seed + r.get("trial", 0)
+        ):
+            done[(r["case_id"], r["trial"])] = r
+
+    pending = [
+        (case, trial)
+        for case in cases
+        for trial in range(case["trials"])
+        if (case["id"], trial) not in done
+    ]
+    if progress:
+        total = sum(c["trials"] for c in cases)
+        print(f"{len(cases)} cases, {total} trials, {total - len(pending)} already checkpointed")
+
+    cache = ResponseCache(cache_path)
+    checkpoint = _JsonlAppender(checkpoint_path)
+    new_records = []
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = [executor.submit(run_trial, case, trial, cache, model, seed) for case, trial in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            new_records.append(record)
+            if not record.get("failed"):
+                checkpoint.append(record)
+                done[(record["case_id"], record["trial"])] = record
+            if progress:
+                print(f"Completed {n}/{len(pending)} ...", end="\r", flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished trials are checkpointed, re-run to resume.")
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+        cache.writer.close()
+    wall = time.perf_counter() - start
+
+    if progress:
+        print()
+    return build_report(cases, list(done.values()), new_records, wall)
+
+
+def build_report(cases, records, new_records, wall_seconds):
+    by_case = {}
+    for r in records:
+        by_case.setdefault(r["case_id"], []).append(r)
+
+    case_rows = []
+    desired_total = acceptable_total = trials_total = errors_total = 0
+    for case in cases:
+        rows = by_case.get(case["id"], [])
+        desired = sum(1 for r in rows if r["output"] in case["desired"])
+        acceptable = desired + sum(1 for r in rows if r["output"] in case["acceptable"])
+        errors = sum(1 for r in rows if r["error"])
+
+        desired_total += desired
+        acceptable_total += acceptable
+        trials_total += len(rows)
+        errors_total += errors
+        case_rows.append({
+            "id": case["id"],
+            "query": case["query"],
+            "trials": len(rows),
+            "accuracy": round(desired / len(rows), 4) if rows else None,
+            "acceptable_accuracy": round(acceptable / len(rows), 4) if rows else None,
+            "errors": errors,
+        })
+
+    llm_latencies = [r["latency_s"] for r in new_records if not r["cached"] and not r.get("failed")]
+    return {
+        "summary": {
+            "cases": len(cases),
+            "trials": trials_total,
+            "accuracy": round(desired_total / trials_total, 4) if trials_total else None,
+            "acceptable_accuracy": round(acceptable_total / trials_total, 4) if trials_total else None,
+            "errors": errors_total,
+            "failed_calls_this_run": sum(1 for r in new_records if r.get("failed")),
+            "trials_this_run": len(new_records),
+            "cache_hits_this_run": sum(1 for r in new_records if r["cached"]),
+            "wall_seconds": round(wall_seconds, 3),
+            "trials_per_s": round(len(new_records) / wall_seconds, 3) if wall_seconds > 0 else None,
+            "llm_latency": summarize_latencies(llm_latencies, wall_seconds),
+        },
+        "cases": case_rows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the query classifier on labelled cases.")
+    parser.add_argument("--cases", default=os.path.join(os.path.dirname(__file__), "eval_cases.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint", default="eval_checkpoint.jsonl")
+    parser.add_argument("--cache", default="eval_cache.jsonl")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="eval_report.json")
+    args = parser.parse_args(argv)
+
+    cases = load_cases(args.cases)
+    report = run_eval(
+        cases,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+        cache_path=args.cache,
+        model=args.model,
+        seed=args.seed,
+    )
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    s = report["summary"]
+    for row in report["cases"]:
+        if row["accuracy"] is not None and row["accuracy"] < 1:
+            print(f"{row['accuracy'] * 100:5.1f}%  {row['query']}")
+    print(f"\nTrue accuracy: {s['accuracy'] * 100:.1f}%" if s["accuracy"] is not None else "\nNo trials run.")
+    if s["acceptable_accuracy"] is not None:
+        print(f"Acceptable-inclusive accuracy: {s['acceptable_accuracy'] * 100:.1f}%")
+    print(f"Trials this run: {s['trials_this_run']} ({s['cache_hits_this_run']} cached) "
+          f"in {s['wall_seconds']} s, {s['trials_per_s']} trials/s")
+    if s["llm_latency"].get("n"):
+        print(f"LLM latency p50 {s['llm_latency']['p50_ms']} ms, p95 {s['llm_latency']['p95_ms']} ms")
+    print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,47 @@
 import sys
 import os
+import re
 import json
-from ollama import chat
-from ollama import ChatResponse
+import hashlib
 from ..data_agent.data_agent import DataAgent
+from ..data_agent.partitions import find_partitions
+from ..data_agent.spatial import geodesic_miles
 from ..routing_agent import RoutingAgent
+from .. import tracing
+from ..lazy import lazy_import
+from ..cache import RESULT_CACHE, GEOHASH_PRECISION, ResultCache, geohash, geohash_bounds, normalize_query
 
+ollama = lazy_import("ollama")
+
+# where DataAgent loads shelters/hazards from (overridable, e.g. for benchmarks)
+DATA_PATH = os.environ.get("SHELTER_DATA_PATH", "src/data_agent/data")
+# restrict shelters to one state ("" for none); unset, state_filter() picks one from the data
+STATE_FILTER = os.environ.get("SHELTER_STATE_FILTER")
+# classifications of recently seen query texts (kept apart from RESULT_CACHE's answer stats)
+INTENT_CACHE = ResultCache(ttl_s=RESULT_CACHE.ttl_s, max_entries=RESULT_CACHE.max_entries, enabled=RESULT_CACHE.enabled)
 
 #gets response from LLM
-def get_response(prompt, model="llama3.1:8b"):
-    response: ChatResponse = chat(
+@tracing.traced("llm.chat")
+def get_response(prompt, model="llama3.1:8b", seed=None):
+    options={"temperature":0.075}
+    if seed is not None:
+        options["seed"]=seed
+    response: ollama.ChatResponse = ollama.chat(
         model=model, 
         messages=[{'role': 'system', 'content': prompt}],
         format="json",
-        options={"temperature":0.075}
+        options=options
+    )
+    tracing.current().set(
+        model=model,
+        prompt_chars=len(prompt),
+        prompt_tokens=response.prompt_eval_count,
+        completion_tokens=response.eval_count,
     )
     return response.message.content
 
-#returns required data for answering response
-def interpret_query(query):
+#builds the classification prompt for a query
+def build_classification_prompt(query):
     json_template={
         "Question":query,
         "Response":{
@@ -47,9 +70,11 @@ def interpret_query(query):
     {json_template}
     </json_template>
     """
-    
-    #get response based on prompt
-    response=json.loads(get_response(prompt).lower())
+    return prompt
+
+#parses the LLM's filled-in template into [need_shelter_data, need_routing_data]
+def parse_classification(raw):
+    response=json.loads(raw.lower())
     need_shelter_data=False
     need_routing_data=False
     error=""
@@ -74,6 +99,14 @@ def interpret_query(query):
     
     return [need_shelter_data, need_routing_data], response, error
 
+#returns required data for answering response
+@tracing.traced("orchestration.interpret_query")
+def interpret_query(query, seed=None):
+    prompt=build_classification_prompt(query)
+    
+    #get response based on prompt
+    return parse_classification(get_response(prompt, seed=seed))
+
 def test_queries():
     tests=[
         #Asking for only shelter data
@@ -142,24 +175,167 @@ def test_queries():
         print("Acceptable-inclusive accuracy:",str(acceptable/trials*100)+"%")
         print("True accuracy:",str(desired/trials*100)+"%\n")
         
-def main(query, lat, lon):
-    print("Query:",query)
-    print(lat,lon)
-    output, response, error = interpret_query(query)
+#shelter filters a query asks for (names from data_agent/filters.py), matched on the normalized text
+FILTER_PATTERNS = {
+    "accessible": r"\b(wheelchair|accessible|handicap\w*|disabled|disability|mobility)\b",
+    "pets": r"\b(pets?|dogs?|cats?|animals?)\b",
+    "generator": r"\b(generators?|backup power|electricity|power outage)\b",
+    "open": r"\b(open|opened)\b",
+    "flood_safe": r"\b(flood safe|safe from (the )?flood\w*|(outside|out of|away from|not in) (the |a )?flood\w*|high(er)? ground)\b",
+}
+
+def extract_filters(query):
+    text = normalize_query(query)
+    return [name for name, pattern in FILTER_PATTERNS.items() if re.search(pattern, text)]
+
+#interpret_query, cached per normalized query text (classification errors are not cached)
+def classify(query):
+    return INTENT_CACHE.get_or_compute(
+        normalize_query(query),
+        lambda: interpret_query(query),
+        cacheable=lambda result: result[2]=="",
+    )
+
+#state filter in effect: SHELTER_STATE_FILTER if set, otherwise "CT" for the Connecticut data
+#loaded up front and none for partitioned (nationwide) data
+def state_filter(agent=None):
+    if STATE_FILTER is not None:
+        return STATE_FILTER or None
+    partitioned = agent.partitions is not None if agent is not None else find_partitions(DATA_PATH) is not None
+    return None if partitioned else "CT"
+
+#cache key of the shelter scan shared by everyone in the same geohash cell asking with the
+#same filters (and, for flood_safe, from a point a flood layer maps or not, like the caller's)
+def scan_key(lat, lon, agent, filters=()):
+    return (
+        geohash(lat, lon, GEOHASH_PRECISION),
+        tuple(filters),
+        "flood_safe" in filters and agent.flood_mapped(lat, lon),
+        state_filter(agent),
+        DATA_PATH,
+        agent.data_version,
+    )
+
+#largest distance in miles between two points of a geohash cell (its diagonal)
+def cell_diameter_miles(code):
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(code)
+    return float(geodesic_miles(lat_lo, lon_lo, lat_hi, lon_hi))
+
+#every shelter that can be among the `limit` nearest for some point within `spread` miles of
+#(lat, lon): by the triangle inequality none farther than the limit-th nearest plus 2*spread
+#(+0.01 for rounding) can; the point itself is left out so the scan can be shared
+def shelter_scan(agent, lat, lon, filters, spread, limit=5, log=print):
+    want = limit
+    while True:
+        shelter_data = search_shelters(agent, lat, lon, filters, log, limit=want)
+        found = shelter_data["nearest_shelters"]
+        if not spread or len(found) < want:
+            break
+        miles = [s["straightline_distance_miles"] for s in found]
+        if miles[-1] > miles[limit - 1] + 2 * spread + 0.01:
+            break
+        want *= 2
+    return {k: v for k, v in shelter_data.items() if k != "input_location"}
+
+#the caller's `limit` nearest shelters in a shelter scan, measured from their own position
+def for_caller(scan, lat, lon, limit=5):
+    shelters = scan["nearest_shelters"]
+    miles = geodesic_miles(lat, lon, [s["lat"] for s in shelters], [s["lon"] for s in shelters]) if shelters else []
+    nearest = sorted(zip(miles, range(len(shelters))))[:limit]
+    return {
+        "input_location": {"lat": lat, "lon": lon},
+        **scan,
+        "nearest_shelters": [
+            dict(shelters[i], straightline_distance_miles=round(float(m), 2)) for m, i in nearest
+        ],
+    }
+
+#nearest shelters for the caller; the scan behind them is cached per geohash cell
+def nearest_shelters(agent, lat, lon, filters, log=print, limit=5):
+    key = scan_key(lat, lon, agent, filters)
+    spread = cell_diameter_miles(key[0]) if RESULT_CACHE.enabled else 0.0
+    scan = RESULT_CACHE.get_or_compute(
+        ("shelters",) + key, lambda: shelter_scan(agent, lat, lon, filters, spread, limit, log)
+    )
+    return for_caller(scan, lat, lon, limit)
+
+#classifies the query and builds its context; None on errors
+def _context(query, lat, lon, agent, log):
+    log("Query:",query)
+    log(lat,lon)
+    output, response, error = classify(query)
     if error!="":
-        print("Error in interpret_query:",error)
-        print("Response:",response)
-        return
-        
+        log("Error in interpret_query:",error)
+        log("Response:",response)
+        return None
+    return build_context(query, lat, lon, output, agent, log, extract_filters(query))
+
+@tracing.traced("orchestration.main")
+def main(query, lat, lon, agent=None, verbose=True):
+    #agent: an already loaded DataAgent to reuse (e.g. in a long-lived service)
+    #verbose: print progress and the resulting JSON (CLI behavior)
+    log = print if verbose else (lambda *args, **kwargs: None)
+    context = _context(query, lat, lon, agent, log)
+    if context is not None and verbose:
+        print(json.dumps(context, indent=2))
+    return context
+
+#context plus respond(query, context) (e.g. the LLM summary); the response is cached under
+#the exact query and context it was written for
+@tracing.traced("orchestration.answer")
+def answer(query, lat, lon, respond, agent=None):
+    context = _context(query, lat, lon, agent, lambda *args, **kwargs: None)
+    if context is None:
+        return None, None
+    digest = hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()
+    key = ("response", query, digest)
+    return context, RESULT_CACHE.get_or_compute(key, lambda: respond(query, context))
+
+#adds each route's flood-zone exposure (meters per risk class, first high-risk entry)
+def annotate_flood_exposure(agent, routes):
+    with tracing.span("routing.flood_exposure", routes=len(routes)):
+        for route in routes:
+            route["flood_exposure"] = agent.route_flood_exposure(route.get("path_coordinates"))
+    return routes
+
+#nearest shelters for filters guessed from the wording: a guessed filter no shelter
+#matches (e.g. "open" while every shelter is closed) is dropped and listed under
+#"unmatched_filters" instead of leaving the caller with no shelter at all
+def search_shelters(agent, lat, lon, filters, log=print, limit=5):
+    search = lambda names: agent.get_nearest_shelters(
+        lat, lon, limit=limit, state_filter=state_filter(agent), filters=names
+    )
+    shelter_data = search(filters)
+    if not filters or shelter_data["nearest_shelters"]:
+        return shelter_data
+
+    kept = [name for name in filters if search([name])["nearest_shelters"]]
+    fallback = search(kept) if kept else None
+    if fallback is None or not fallback["nearest_shelters"]:
+        kept, fallback = [], search([])
+    if not fallback["nearest_shelters"]:
+        return shelter_data
+    fallback["unmatched_filters"] = [name for name in filters if name not in kept]
+    log("No shelter matches filters:", ", ".join(fallback["unmatched_filters"]))
+    return fallback
+
+#runs the data/routing agents the classification asked for
+def build_context(query, lat, lon, output, agent=None, log=print, filters=None):
     shelter_data = None
     if output[0]:
-        agent = DataAgent(base_path="src/data_agent/data")
-        shelter_data = agent.handle_query(lat=lat, lon=lon, state="CT")
+        if agent is None:
+            with tracing.span("data_agent.load", base_path=DATA_PATH):
+                agent = DataAgent(base_path=DATA_PATH)
+        if filters:
+            log("Shelter filters:", ", ".join(filters))
+        shelter_data = nearest_shelters(agent, lat, lon, filters, log)
+        if shelter_data.get("unavailable_filters"):
+            log("No data for filters:", ", ".join(shelter_data["unavailable_filters"]))
     else:
-        print("Data agent not necessary")
+        log("Data agent not necessary")
 
     if output[1] and shelter_data:
-        print("Starting routing agent...")
+        log("Starting routing agent...")
         shelters_for_routing = {}
         for shelter in shelter_data["nearest_shelters"]:
             shelters_for_routing[shelter["name"]] = [shelter["lat"], shelter["lon"]]
@@ -169,12 +345,17 @@ def main(query, lat, lon):
             user_lon=lon, 
             shelters=shelters_for_routing
         )
+        annotate_flood_exposure(agent, routing_result["routes"])
 
         combined_result = {
             "query": query,
             "user_location": shelter_data["input_location"],
+            "filters": shelter_data["filters"],
             "shelters": []
         }
+        for field in ("unavailable_filters", "unmatched_filters"):
+            if shelter_data.get(field):
+                combined_result[field] = shelter_data[field]
 
 
         routing_lookup = {route["shelter_name"]: route for route in routing_result["routes"]}
@@ -201,14 +382,12 @@ def main(query, lat, lon):
             }
             combined_result["shelters"].append(combined_shelter)
 
-        print("\n" + "="*50)
-        print("COMBINED RESULT")
-        print("="*50)
-        print(json.dumps(combined_result, indent=2))
+        log("\n" + "="*50)
+        log("COMBINED RESULT")
+        log("="*50)
         return combined_result
     elif output[1]:
-        print(f"Routing not triggered. need_routing, but no shelter data.")
+        log(f"Routing not triggered. need_routing, but no shelter data.")
         return
     
-    print(json.dumps(shelter_data, indent=2))
     return shelter_data
\ No newline at end of file
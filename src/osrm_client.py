@@ -0,0 +1,308 @@
+"""
+OSRM HTTP client with failover endpoints, hedged requests and circuit breakers.
+
+A single slow or dead OSRM host used to stall every route (10 s timeout per
+shelter). OSRMClient instead takes a list of endpoints, in order of
+preference, and for each request:
+
+- sends it to the first endpoint whose circuit breaker allows traffic,
+  trying endpoints that are slow lately (p95 over the last demote_window_s
+  above the hedge delay) only after the others;
+- if no answer arrives within the recent p95 latency (hedge_quantile) of the
+  fastest endpoint, sends a duplicate to the next endpoint and takes
+  whichever answers first;
+- on an error (connection failure, timeout, 5xx) moves straight on to the
+  next endpoint, all within one overall deadline (timeout_s).
+
+Each endpoint has its own thread pool, so attempts left running on a slow
+endpoint cannot hold up hedges to the others; attempts still queued when the
+caller already has its answer are cancelled. Each endpoint also has a
+circuit breaker: after failure_threshold consecutive failures it is skipped
+for reset_after_s, then a single trial request decides whether it closes
+again. When every breaker is open the call fails fast. A slow endpoint is
+not cut off: once its slow samples age out of demote_window_s it is tried
+first again. stats() reports per-endpoint latency histograms, breaker state,
+demotion and counters.
+
+    client = OSRMClient(["http://localhost:5000", "http://router.project-osrm.org"])
+    data = client.get("/route/v1/driving/-72.9,41.3;-72.8,41.4?overview=false")
+"""
+import time
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import tracing
+from .lazy import lazy_import
+
+requests = lazy_import("requests")
+
+# histogram bucket upper bounds in seconds (last bucket is everything slower)
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class OSRMError(RuntimeError):
+    """OSRM answered, but not with a route (bad request, no route found, ...)."""
+
+
+class OSRMUnavailable(RuntimeError):
+    """No endpoint produced an answer in time."""
+
+
+# -------------------------------------------------------------
+class LatencyHistogram:
+    """Cumulative bucketed histogram plus a window of recent samples for percentiles."""
+
+    def __init__(self, window=256):
+        self.counts = [0] * (len(BUCKETS_S) + 1)
+        self.recent = deque(maxlen=window)      # (monotonic time, seconds)
+        self.total = 0
+        self.sum_s = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS_S, seconds)] += 1
+        self.recent.append((time.monotonic(), seconds))
+        self.total += 1
+        self.sum_s += seconds
+
+    def percentile(self, q, max_age_s=None, min_samples=1):
+        """
+        q-quantile (0..1) of the recent window (only samples younger than
+        max_age_s, if given), or None with fewer than min_samples samples.
+        """
+        since = time.monotonic() - max_age_s if max_age_s is not None else None
+        ordered = sorted(s for t, s in self.recent if since is None or t >= since)
+        if len(ordered) < max(min_samples, 1):
+            return None
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def to_dict(self):
+        labels = [f"le_{b * 1000:g}ms" for b in BUCKETS_S] + ["inf"]
+        p = {f"p{int(q * 100)}_ms": self.percentile(q) for q in (0.5, 0.95, 0.99)}
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_s / self.total * 1000, 2) if self.total else None,
+            **{k: round(v * 1000, 2) if v is not None else None for k, v in p.items()},
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open after a cool-down."""
+
+    def __init__(self, failure_threshold=3, reset_after_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_running = False
+
+    def allow(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after_s:
+            self.state = "half_open"
+        if self.state == "half_open":
+            # let exactly one trial request through
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_running = False
+
+    def release(self):
+        """An allowed request was dropped before it ran; a half-open trial may go again."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class Endpoint:
+    def __init__(self, url, failure_threshold, reset_after_s, max_workers, name):
+        self.url = url.rstrip("/")
+        self.latency = LatencyHistogram()
+        self.breaker = CircuitBreaker(failure_threshold, reset_after_s)
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self.demoted = False
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "state": self.breaker.state,
+            "trips": self.breaker.trips,
+            "demoted": self.demoted,
+            "requests": self.requests,
+            "failures": self.failures,
+            "hedges_sent": self.hedges,
+            "wins": self.wins,
+            "latency": self.latency.to_dict(),
+        }
+
+
+# -------------------------------------------------------------
+class OSRMClient:
+
+    def __init__(self, urls, timeout_s=10.0, connect_timeout_s=3.0, hedge_quantile=0.95,
+                 hedge_min_s=0.05, hedge_default_s=0.3, min_samples=20,
+                 failure_threshold=3, reset_after_s=30.0, demote_window_s=30.0, max_workers=32):
+        """max_workers: concurrent attempts per endpoint (each endpoint has its own pool)."""
+        if not urls:
+            raise ValueError("OSRMClient needs at least one endpoint URL")
+        self.urls = tuple(urls)
+        self.endpoints = [
+            Endpoint(u, failure_threshold, reset_after_s, max_workers, f"osrm-{i}")
+            for i, u in enumerate(urls)
+        ]
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_s = hedge_min_s
+        self.hedge_default_s = hedge_default_s
+        self.min_samples = min_samples
+        self.demote_window_s = demote_window_s
+
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    # ---------------------------------------------------------
+    def _next_endpoint(self, tried):
+        """
+        Next untried endpoint its breaker allows: in preference order, but
+        endpoints whose recent p95 is above the hedge delay after the rest
+        (a request sent there first would usually be hedged anyway).
+        """
+        threshold = self._hedge_delay()
+        with self._lock:
+            for ep in self.endpoints:
+                p95 = ep.latency.percentile(self.hedge_quantile, self.demote_window_s, self.min_samples)
+                ep.demoted = p95 is not None and p95 > threshold
+            for ep in sorted(self.endpoints, key=lambda ep: ep.demoted):
+                if ep not in tried and ep.breaker.allow():
+                    ep.requests += 1
+                    return ep
+        return None
+
+    def _hedge_delay(self):
+        """
+        p95 of the fastest endpoint (hedge_default_s for endpoints with too few
+        samples yet). Using the fastest one, not the endpoint being waited on,
+        keeps hedging prompt when the primary degrades and its own p95 grows.
+        """
+        with self._lock:
+            delays = [
+                ep.latency.percentile(self.hedge_quantile)
+                if ep.latency.total >= self.min_samples else self.hedge_default_s
+                for ep in self.endpoints
+            ]
+        return max(self.hedge_min_s, min(delays))
+
+    def _fetch(self, ep, path, deadline):
+        """One HTTP attempt; returns ("ok" | "answer" | "failed", payload)."""
+        start = time.monotonic()
+        try:
+            read_timeout = max(deadline - start, 0.001)
+            r = self._session.get(
+                ep.url + path, timeout=(min(self.connect_timeout_s, read_timeout), read_timeout)
+            )
+            outcome = "failed" if r.status_code >= 500 else "ok" if r.status_code == 200 else "answer"
+            payload = r
+        except Exception as e:
+            outcome, payload = "failed", e
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            if outcome == "failed":
+                ep.failures += 1
+                ep.breaker.record_failure()
+            else:
+                ep.latency.observe(elapsed)
+                ep.breaker.record_success()
+        return outcome, payload
+
+    def get(self, path):
+        """GET path (starting with "/") from the best endpoint; returns the decoded JSON."""
+        deadline = time.monotonic() + self.timeout_s
+        tried = []
+        running = {}
+        errors = []
+        span = tracing.current()
+
+        def launch():
+            ep = self._next_endpoint(tried)
+            if ep is None:
+                return None
+            tried.append(ep)
+            running[ep.pool.submit(self._fetch, ep, path, deadline)] = ep
+            return ep
+
+        if launch() is None:
+            raise OSRMUnavailable("every OSRM endpoint's circuit breaker is open")
+        can_hedge = True
+
+        try:
+            while running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # wait until the newest attempt is slower than a typical answer
+                wait_s = min(self._hedge_delay(), remaining) if can_hedge else remaining
+                done, _ = wait(list(running), timeout=wait_s, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    ep = launch()
+                    if ep is None:
+                        can_hedge = False
+                    else:
+                        with self._lock:
+                            ep.hedges += 1
+                    continue
+
+                for future in done:
+                    ep = running.pop(future)
+                    outcome, payload = future.result()
+                    if outcome == "failed":
+                        errors.append(f"{ep.url}: {payload}")
+                        continue
+                    with self._lock:
+                        ep.wins += 1
+                    span.set(endpoint=ep.url, attempts=len(tried), status=payload.status_code)
+                    if outcome == "answer":
+                        raise OSRMError(f"OSRM error {payload.status_code}: {payload.text}")
+                    return payload.json()
+
+                # every attempt so far failed: fail over straight away
+                if not running and launch() is None:
+                    break
+        finally:
+            # attempts still queued behind a slow endpoint are not needed any more
+            for future, ep in running.items():
+                if future.cancel():
+                    with self._lock:
+                        ep.breaker.release()
+
+        span.set(attempts=len(tried))
+        detail = "; ".join(errors) or f"no answer within {self.timeout_s} s"
+        raise OSRMUnavailable(f"OSRM request failed ({detail})")
+
+    def stats(self):
+        with self._lock:
+            return {"endpoints": [ep.to_dict() for ep in self.endpoints]}
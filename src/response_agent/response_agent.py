@@ -1,11 +1,15 @@
 import json
-from ollama import chat
-from ollama import ChatResponse
+import copy
 from src.orchestration.orchestration import main as run_orchestration
+from src import tracing
+from src.lazy import lazy_import
+
+ollama = lazy_import("ollama")
 
 #gets response from LLM
+@tracing.traced("llm.chat")
 def get_response(prompt, model="llama3.1:8b"):
-	response: ChatResponse = chat(
+	response: ollama.ChatResponse = ollama.chat(
 		model=model, 
 		messages=[
             {"role": "system", "content": "You are an emergency response summarization assistant."},
@@ -13,8 +17,23 @@ def get_response(prompt, model="llama3.1:8b"):
         ],
 		options={"temperature":0.075}
 	)
+	tracing.current().set(
+		model=model,
+		prompt_chars=len(prompt),
+		prompt_tokens=response.prompt_eval_count,
+		completion_tokens=response.eval_count,
+	)
 	return response.message.content.strip()
 
+def llm_context(context):
+    """Copy of the orchestration context without route geometry (too long for the prompt)."""
+    context = copy.deepcopy(context)
+    for shelter in context.get("shelters", []):
+        if shelter.get("route") and "path_coordinates" in shelter["route"]:
+            del shelter["route"]["path_coordinates"]
+    return context
+
+@tracing.traced("response.generate_response")
 def generate_response(query, context):
     prompt = f"""
     You are a calm, friendly emergency response assistant.
@@ -57,6 +76,9 @@ def generate_response(query, context):
     Your job:
     - Summarize EACH shelter listed
     - If route information is present, include brief directions or travel details for that shelter
+    - If a route's flood_exposure lists "High" meters, warn that the route passes through a high-risk flood zone
+    - If "unavailable_filters" is present, say those filters could not be checked here (flood_safe: no flood map covers this area)
+    - If "unmatched_filters" is present, say no shelter meets those requirements and that the shelters listed do not necessarily meet them
     - Output one shelter per line in plain text
     - DO NOT output JSON and DO NOT add or invent any information
     
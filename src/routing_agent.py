@@ -1,8 +1,28 @@
-import requests
-import polyline
+import os
+import threading
 from math import atan2, degrees
+from . import tracing
+from .lazy import lazy_import
+from .osrm_client import OSRMClient
+
+polyline = lazy_import("polyline")
 
 OSRM_URL = "http://router.project-osrm.org"
+# OSRM endpoints in order of preference, e.g. a self-hosted server first and
+# the public demo server as fallback: OSRM_URLS="http://localhost:5000,http://router.project-osrm.org"
+OSRM_URLS = [u.strip() for u in os.environ.get("OSRM_URLS", "").split(",") if u.strip()]
+
+_client = None
+_client_lock = threading.Lock()
+
+def client():
+    """Shared OSRMClient (hedging, failover, circuit breakers) for the configured endpoints."""
+    global _client
+    urls = tuple(OSRM_URLS or [OSRM_URL])
+    with _client_lock:
+        if _client is None or _client.urls != urls:
+            _client = OSRMClient(urls)
+        return _client
 
 class RoutingAgent:
 
@@ -23,17 +43,14 @@ class RoutingAgent:
             return "Turn left"
 
     @staticmethod
+    @tracing.traced("routing.osrm")
     def call_osrm(user_lat, user_lon, dest_lat, dest_lon):
-        url = (
-            f"{OSRM_URL}/route/v1/driving/"
+        path = (
+            f"/route/v1/driving/"
             f"{user_lon},{user_lat};{dest_lon},{dest_lat}"
             "?overview=full&geometries=polyline&steps=true"
         )
-        r = requests.get(url, timeout=10)
-        if r.status_code != 200:
-            raise RuntimeError(f"OSRM error {r.status_code}: {r.text}")
-
-        data = r.json()
+        data = client().get(path)
         if "routes" not in data or not data["routes"]:
             raise RuntimeError("No routes returned from OSRM")
 
@@ -41,6 +58,7 @@ class RoutingAgent:
 
         # Decode full geometry for folium polyline
         path_coords = polyline.decode(route["geometry"])
+        tracing.current().set(path_points=len(path_coords))
 
         return {
             "distance_m": route["distance"],
@@ -95,8 +113,10 @@ class RoutingAgent:
         return directions
 
     @staticmethod
+    @tracing.traced("routing.get_routes")
     def get_routes(user_lat, user_lon, shelters, max_results=5):
         results = []
+        tracing.current().set(shelters=len(shelters))
 
         for name, coords in shelters.items():
             dest_lat, dest_lon = coords[0], coords[1]
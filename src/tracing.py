@@ -0,0 +1,175 @@
+"""
+Lightweight tracing spans for the shelter pipeline.
+
+A trace is started by the caller (e.g. the Streamlit bridge) with trace();
+the pipeline stages open nested spans with span(). When no trace is active,
+span() returns a shared no-op object, so instrumented code costs one
+ContextVar lookup per stage.
+
+    with tracing.trace("handle_user_query", query=query) as t:
+        ...
+        with tracing.span("data_agent.load") as s:
+            s.set(rows=len(df))
+    t.to_dict()   # nested tree with durations and attributes
+
+Set SDP_TRACE_FILE=traces.jsonl to append every finished trace to a JSONL
+file for offline analysis, or SDP_TRACE=0 to turn tracing off entirely.
+"""
+import os
+import json
+import time
+import threading
+import functools
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+ENABLED = os.environ.get("SDP_TRACE", "1") != "0"
+TRACE_FILE = os.environ.get("SDP_TRACE_FILE")
+
+_current = ContextVar("sdp_current_span", default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "children", "start", "duration_ms", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.start = None
+        self.duration_ms = None
+        self._token = None
+
+    def set(self, **attrs):
+        """Record attributes (input sizes, cache hits, token counts ...)."""
+        self.attrs.update(attrs)
+        return self
+
+    def incr(self, key, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+        return self
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        return False
+
+    def to_dict(self, _root_start=None):
+        root_start = self.start if _root_start is None else _root_start
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - root_start) * 1000, 3),
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "children": [c.to_dict(root_start) for c in self.children],
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned when no trace is active; every method does nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        return self
+
+    def incr(self, key, n=1):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def to_dict(self):
+        return None
+
+
+NOOP = _NoopSpan()
+
+
+class _Trace(Span):
+    """Root span; appends itself to the trace file when it finishes."""
+
+    __slots__ = ("trace_file",)
+
+    def __init__(self, name, attrs, trace_file):
+        super().__init__(name, attrs)
+        self.trace_file = trace_file
+
+    def __enter__(self):
+        # a trace always starts a fresh tree, even inside another one
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        if self.trace_file:
+            append_jsonl(self.trace_file, self.to_dict())
+        return False
+
+
+# -------------------------------------------------------------
+def trace(name, trace_file=None, **attrs):
+    """Start a new trace tree (root span)."""
+    if not ENABLED:
+        return NOOP
+    return _Trace(name, attrs, trace_file or TRACE_FILE)
+
+
+def span(name, **attrs):
+    """Open a child span of the active one; no-op when nothing is being traced."""
+    if _current.get() is None:
+        return NOOP
+    return Span(name, attrs)
+
+
+def traced(name):
+    """Decorator form of span() for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current():
+    """The active span (or the no-op span), for setting attributes in place."""
+    return _current.get() or NOOP
+
+
+def append_jsonl(path, tree):
+    record = {"timestamp": datetime.now(timezone.utc).isoformat(), "trace": tree}
+    line = json.dumps(record, default=str)
+    with _file_lock:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+def format_tree(tree, indent=0):
+    """Render a to_dict() tree as indented text lines."""
+    if not tree:
+        return ""
+    attrs = ", ".join(f"{k}={v}" for k, v in tree["attrs"].items())
+    line = f"{'  ' * indent}{tree['name']}  {tree['duration_ms']:.1f} ms"
+    if attrs:
+        line += f"  [{attrs}]"
+    lines = [line] + [format_tree(c, indent + 1) for c in tree["children"]]
+    return "\n".join(lines)
@@ -0,0 +1,119 @@
+"""
+Resident worker for repeated CLI queries over a local Unix socket.
+
+A one-off `python main.py "<query>"` pays for imports, loading every dataset
+and warming up the Ollama model before answering. `python main.py --serve`
+does that once and then answers queries sent by `python main.py --client`,
+which only imports the standard library.
+
+Protocol: one JSON line per connection each way.
+    request:  {"query": "...", "lat": 41.29, "lon": -72.38}
+    response: {"context": {...}, "response": "..."}  or  {"error": "..."}
+"""
+import os
+import sys
+import json
+import socket
+import getpass
+import tempfile
+import socketserver
+
+DEFAULT_SOCKET = os.environ.get(
+    "SDP_SOCKET", os.path.join(tempfile.gettempdir(), f"sdp37-{getpass.getuser()}.sock")
+)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # only a malformed request is "bad"; failures inside the pipeline are reported as they are
+        try:
+            request = json.loads(self.rfile.readline())
+            lat, lon = float(request["lat"]), float(request["lon"])
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"lat/lon out of range: {lat}, {lon}")
+            query = request["query"]
+            if not isinstance(query, str):
+                raise TypeError("query must be a string")
+        except KeyError as e:
+            reply = {"error": f"bad request: missing field {e}"}
+        except (ValueError, TypeError) as e:
+            reply = {"error": f"bad request: {e}"}
+        else:
+            try:
+                reply = self.server.answer(query, lat, lon)
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, data_path=None):
+        # heavy imports happen here, once, instead of in every CLI process
+        from .orchestration import orchestration
+        from .data_agent.data_agent import DataAgent
+        from .response_agent.response_agent import generate_response, llm_context
+
+        self.orchestration = orchestration
+        self.respond = lambda q, c: generate_response(q, llm_context(c))
+        self.agent = DataAgent(base_path=data_path or orchestration.DATA_PATH)
+
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def answer(self, query, lat, lon):
+        context, response = self.orchestration.answer(query, lat, lon, self.respond, agent=self.agent)
+        if not context:
+            return {"error": "No context returned from orchestration."}
+        return {"context": context, "response": response}
+
+    def warm_up(self):
+        """Load the LLM into memory so the first real query does not wait for it."""
+        try:
+            self.orchestration.interpret_query("Where is the nearest disaster shelter?")
+        except Exception as e:
+            print(f"LLM warm-up failed ({e}); the first query will load the model.")
+
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.remove(socket_path)
+    else:
+        raise RuntimeError(f"A worker is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+
+def serve(socket_path=DEFAULT_SOCKET, data_path=None):
+    server = WorkerServer(socket_path, data_path)
+    server.warm_up()
+    print(f"Worker ready on {socket_path} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def ask(query, lat, lon, socket_path=DEFAULT_SOCKET, timeout=300):
+    """Send one query to a running worker. Raises OSError when none is listening."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({"query": query, "lat": lat, "lon": lon}).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOCKET)
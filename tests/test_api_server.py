@@ -0,0 +1,49 @@
+"""
+HTTP API status codes: malformed payloads are 400, failures inside the
+pipeline are 500, and both are counted in /metrics.
+"""
+import pytest
+import requests
+
+from src.api.server import Service, start_background
+
+
+class BrokenAgent:
+    """Stands in for DataAgent; every search fails inside the pipeline."""
+    partitions = None
+
+    def get_nearest_shelters(self, *args, **kwargs):
+        raise RuntimeError("index exploded")
+
+
+@pytest.fixture(scope="module")
+def server():
+    service = Service(agent=BrokenAgent(), timeout_s=5.0)
+    url, stop = start_background(service)
+    yield url, service
+    stop()
+
+
+@pytest.mark.parametrize("body, error", [
+    (b"\xff\xfe not utf-8", "body must be a JSON object"),
+    (b"{not json", "body must be a JSON object"),
+    (b"[1, 2]", "body must be a JSON object"),
+    (b'{"lon": -72.9}', "missing field 'lat'"),
+    (b'{"lat": 95, "lon": -72.9}', "out of range"),
+    (b'{"lat": 41.3, "lon": -72.9, "filters": ["sauna"]}', "Unknown shelter filter"),
+])
+def test_malformed_payload_is_400(server, body, error):
+    url, service = server
+    before = service.counts.get("shelters 400", 0)
+    r = requests.post(f"{url}/shelters", data=body, headers={"Content-Type": "application/json"})
+    assert r.status_code == 400
+    assert error in r.json()["error"]
+    assert service.counts["shelters 400"] == before + 1
+
+
+def test_pipeline_error_is_500(server):
+    url, service = server
+    r = requests.post(f"{url}/shelters", json={"lat": 41.3, "lon": -72.9})
+    assert r.status_code == 500
+    assert r.json()["error"] == "index exploded"
+    assert service.counts["shelters 500"] == 1
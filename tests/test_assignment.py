@@ -0,0 +1,81 @@
+"""
+assign_evacuees over the synthetic CT dataset: shelter capacity and
+accessibility needs are never violated, and origins with no shelter in reach
+stay unassigned instead of failing.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.benchmark import synthetic
+from src.data_agent.assignment import assign_evacuees, remaining_capacity
+from src.data_agent.data_agent import DataAgent
+from src.data_agent.partitions import build_partitions
+
+
+@pytest.fixture(scope="module")
+def agents(tmp_path_factory):
+    base = str(tmp_path_factory.mktemp("synthetic") / "ct")
+    synthetic.generate("ct", base, seed=0)
+    eager = DataAgent(base_path=base, partitions=False)
+    build_partitions(eager, os.path.join(base, "partitions"))
+    return {
+        "eager": eager,
+        "partitioned": DataAgent(base_path=base, partitions=os.path.join(base, "partitions")),
+    }
+
+
+def crowd(n, seed):
+    """More people than the open shelters hold, a third of them needing access."""
+    rng = np.random.default_rng(seed)
+    lat, lon = np.asarray(synthetic.query_points("ct", n, seed=seed)).T
+    return pd.DataFrame({
+        "lat": lat,
+        "lon": lon,
+        "people": rng.integers(1, 60, size=n),
+        "needs_accessible": rng.random(n) < 0.3,
+    })
+
+
+# -------------------------------------------------------------
+@pytest.mark.parametrize("mode", ["eager", "partitioned"])
+def test_capacity_and_accessibility_respected(agents, mode):
+    origins = crowd(2000, seed=5)
+    result = assign_evacuees(agents[mode], origins)
+    summary, assignments, report = result["summary"], result["assignments"], result["shelters"]
+    assert summary["people"] > summary["eligible_capacity"]        # the auction is contested
+    assert summary["unassigned_people"] > 0 and summary["assigned_people"] > 0
+
+    # synthetic shelter names are unique, so rows can be matched by name
+    shelters = agents["eager"].df.drop_duplicates(["shelter_na", "city", "state"])
+    shelters = shelters.assign(capacity=remaining_capacity(shelters), name=shelters["shelter_na"].str.title())
+    shelters = shelters.set_index("name")
+    assert (report["assigned_people"] <= report["capacity"]).all()
+    assert (shelters.loc[report["name"], "capacity"].to_numpy() == report["capacity"].to_numpy()).all()
+    assert (shelters.loc[report["name"], "shelter_st"] == "OPEN").all()
+
+    placed = assignments[assignments["shelter_index"] >= 0]
+    placed = placed.assign(shelter_name=placed["shelter_name"].str.title())
+    load = placed.groupby("shelter_name")["people"].sum()
+    assert (load.to_numpy() <= shelters.loc[load.index, "capacity"].to_numpy()).all()
+    needy = placed[placed["needs_accessible"]]
+    assert len(needy) > 0
+    assert (shelters.loc[needy["shelter_name"], "handicap_accessible"] == "Yes").all()
+
+@pytest.mark.parametrize("mode", ["eager", "partitioned"])
+def test_no_shelter_in_reach(agents, mode):
+    origins = pd.DataFrame({"lat": [47.0, 47.1], "lon": [-120.0, -120.2], "people": [3, 1]})
+    result = assign_evacuees(agents[mode], origins, statuses=None)
+    assignments, summary = result["assignments"], result["summary"]
+    assert (assignments["shelter_index"] == -1).all()
+    assert assignments["shelter_name"].isna().all() and assignments["distance_miles"].isna().all()
+    assert result["shelters"].empty
+    assert summary["unassigned_origins"] == 2 and summary["unassigned_people"] == 4
+    assert summary["assigned_people"] == 0 and summary["shelters_used"] == 0
+
+
+def test_no_origins(agents):
+    result = assign_evacuees(agents["eager"], pd.DataFrame({"lat": [], "lon": []}))
+    assert result["assignments"].empty and result["summary"]["origins"] == 0
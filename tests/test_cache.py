@@ -0,0 +1,94 @@
+"""
+ResultCache: concurrent misses are computed once, entries expire after the
+TTL and the least recently used ones are evicted past max_entries.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.cache import ResultCache, geohash, geohash_bounds
+
+
+class Counter:
+    def __init__(self, delay_s=0.0):
+        self.calls = 0
+        self.delay_s = delay_s
+        self.lock = threading.Lock()
+
+    def __call__(self, value="value"):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay_s)
+        return value
+
+
+# -------------------------------------------------------------
+def test_concurrent_misses_are_computed_once():
+    cache = ResultCache()
+    compute = Counter(delay_s=0.3)
+    with ThreadPoolExecutor(8) as pool:
+        values = list(pool.map(lambda _: cache.get_or_compute("key", compute), range(8)))
+    assert values == ["value"] * 8
+    assert compute.calls == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 7
+
+
+def test_error_reaches_every_waiter_and_is_not_stored():
+    cache = ResultCache()
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    def call(_):
+        with pytest.raises(RuntimeError, match="boom"):
+            cache.get_or_compute("key", fail)
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(call, range(4)))
+    assert cache.get_or_compute("key", Counter()) == "value"
+
+
+def test_entries_expire_after_ttl():
+    cache = ResultCache(ttl_s=0.1)
+    compute = Counter()
+    cache.get_or_compute("key", compute)
+    cache.get_or_compute("key", compute)
+    assert compute.calls == 1
+    time.sleep(0.15)
+    cache.get_or_compute("key", compute)
+    assert compute.calls == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(max_entries=2)
+    compute = Counter()
+    cache.get_or_compute("a", compute)
+    cache.get_or_compute("b", compute)
+    cache.get_or_compute("a", compute)         # "b" is now the least recently used
+    cache.get_or_compute("c", compute)
+    assert cache.stats()["evictions"] == 1
+    cache.get_or_compute("a", compute)
+    assert compute.calls == 3
+    cache.get_or_compute("b", compute)
+    assert compute.calls == 4
+
+
+def test_disabled_cache_always_computes():
+    cache = ResultCache(enabled=False)
+    compute = Counter()
+    cache.get_or_compute("key", compute)
+    cache.get_or_compute("key", compute)
+    assert compute.calls == 2 and cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("lat, lon", [(41.3, -72.9), (-33.9, 151.2), (0.0, 0.0)])
+def test_geohash_bounds_contain_point(lat, lon):
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(geohash(lat, lon, 6))
+    assert lat_lo <= lat < lat_hi and lon_lo <= lon < lon_hi
+    assert lat_hi - lat_lo == pytest.approx(180 / 2 ** 15)
+    assert lon_hi - lon_lo == pytest.approx(360 / 2 ** 15)
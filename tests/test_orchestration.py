@@ -0,0 +1,160 @@
+"""
+Orchestration pipeline pieces that do not need the LLM or OSRM.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.benchmark import synthetic
+from src.cache import RESULT_CACHE, geohash, geohash_bounds
+from src.data_agent.data_agent import DataAgent
+from src.orchestration import orchestration
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+@pytest.fixture(scope="module")
+def agent(tmp_path_factory):
+    base = str(tmp_path_factory.mktemp("synthetic") / "ct")
+    synthetic.generate("ct", base, seed=0)
+    return DataAgent(base_path=base, partitions=False)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(RESULT_CACHE, "enabled", True)
+    monkeypatch.setattr(orchestration, "STATE_FILTER", None)
+    RESULT_CACHE.clear()
+    yield RESULT_CACHE
+    RESULT_CACHE.clear()
+
+
+# -------------------------------------------------------------
+@pytest.mark.parametrize("setting, partitions, expected", [
+    (None, None, "CT"),          # Connecticut data loaded up front
+    (None, object(), None),      # partitioned (nationwide) data
+    ("", None, None),
+    ("NY", object(), "NY"),
+])
+def test_state_filter(monkeypatch, setting, partitions, expected):
+    monkeypatch.setattr(orchestration, "STATE_FILTER", setting)
+    assert orchestration.state_filter(SimpleNamespace(partitions=partitions)) == expected
+
+
+def test_state_filter_follows_data_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(orchestration, "STATE_FILTER", None)
+    monkeypatch.setattr(orchestration, "DATA_PATH", str(tmp_path))
+    assert orchestration.state_filter() == "CT"
+    (tmp_path / "partitions").mkdir()
+    (tmp_path / "partitions" / "index.json").write_text("{}")
+    assert orchestration.state_filter() is None
+
+
+class FilteredAgent:
+    """Shelters that all have a generator and are all closed, like the real CSV's status column."""
+    partitions = None
+
+    def __init__(self, shelters=("Hall", "School")):
+        self.shelters = shelters
+        self.searches = []
+
+    def get_nearest_shelters(self, lat, lon, limit=5, state_filter=None, filters=None):
+        filters = list(filters or [])
+        self.searches.append(filters)
+        found = [] if set(filters) - {"generator"} else self.shelters
+        return {
+            "input_location": {"lat": lat, "lon": lon},
+            "filters": filters,
+            "nearest_shelters": [{"name": name} for name in found],
+        }
+
+
+def names(result):
+    return [s["name"] for s in result["nearest_shelters"]]
+
+
+@pytest.mark.parametrize("query, applied, unmatched", [
+    ("Is there a shelter near me that is open?", [], ["open"]),
+    ("Where can I go with my dog and a generator?", ["generator"], ["pets"]),
+    ("I need a shelter with a generator", ["generator"], None),
+])
+def test_guessed_filters_fall_back(query, applied, unmatched):
+    agent = FilteredAgent()
+    result = orchestration.search_shelters(agent, 41.3, -72.9, orchestration.extract_filters(query), log=quiet)
+    assert names(result) == ["Hall", "School"]
+    assert result["filters"] == applied
+    assert result.get("unmatched_filters") == unmatched
+
+
+def test_no_shelters_at_all_is_not_blamed_on_filters():
+    agent = FilteredAgent(shelters=())
+    result = orchestration.search_shelters(agent, 41.3, -72.9, ["open"], log=quiet)
+    assert names(result) == [] and result["filters"] == ["open"]
+    assert "unmatched_filters" not in result
+
+
+# -------------------------------------------------------------
+def nearest(result):
+    return [(s["name"], s["straightline_distance_miles"]) for s in result["nearest_shelters"]]
+
+
+@pytest.mark.parametrize("filters", [[], ["open"], ["accessible", "generator"]])
+def test_shared_scan_is_exact_for_every_caller(agent, cache, filters):
+    rng = np.random.default_rng(3)
+    before = cache.stats()
+    for lat, lon in synthetic.query_points("ct", 4, seed=6):
+        lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(geohash(lat, lon, orchestration.GEOHASH_PRECISION))
+        callers = zip(rng.uniform(lat_lo, lat_hi, 25), rng.uniform(lon_lo, lon_hi, 25))
+        for lat, lon in callers:
+            shared = orchestration.nearest_shelters(agent, lat, lon, filters, log=quiet)
+            exact = orchestration.search_shelters(agent, lat, lon, filters, log=quiet)
+            assert shared["input_location"] == {"lat": lat, "lon": lon}
+            assert nearest(shared) == nearest(exact)
+    after = cache.stats()
+    assert after["misses"] - before["misses"] == 4
+    assert after["hits"] - before["hits"] == 4 * 24
+
+
+def test_answers_are_per_caller(agent, cache, monkeypatch):
+    routed_from, asked = [], []
+    hits = cache.stats()["hits"]
+    monkeypatch.setattr(orchestration, "classify", lambda query: ((True, True), "", ""))
+
+    def get_routes(user_lat, user_lon, shelters):
+        routed_from.append((user_lat, user_lon))
+        return {"routes": [{"shelter_name": name, "path_coordinates": None} for name in shelters]}
+
+    def respond(query, context):
+        asked.append(query)
+        return f"answer to {query}"
+
+    monkeypatch.setattr(orchestration.RoutingAgent, "get_routes", get_routes)
+    callers = [("Where is the nearest shelter?", 41.30001, -72.90001), ("How do I get to a shelter?", 41.30203, -72.90302)]
+    assert geohash(*callers[0][1:]) == geohash(*callers[1][1:])
+    for query, lat, lon in callers:
+        context, response = orchestration.answer(query, lat, lon, respond, agent=agent)
+        assert response == f"answer to {query}"
+        assert context["query"] == query
+        assert context["user_location"] == {"lat": lat, "lon": lon}
+        assert "measured_from" not in context
+    assert routed_from == [(lat, lon) for _, lat, lon in callers]
+    assert asked == [query for query, _, _ in callers]
+    assert cache.stats()["hits"] == hits + 1           # the second caller reused the shelter scan
+
+    # the same question from the same spot reuses the summary too
+    orchestration.answer(*callers[0], respond, agent=agent)
+    assert len(asked) == 2
+
+
+def test_reload_drops_cached_scans(agent, cache):
+    fresh = DataAgent(base_path=agent.base_path, partitions=False)
+    orchestration.nearest_shelters(fresh, 41.3, -72.9, [], log=quiet)
+    assert cache.stats()["entries"] == 1
+    fresh.reload()
+    assert cache.stats()["entries"] == 0
+    misses = cache.stats()["misses"]
+    orchestration.nearest_shelters(fresh, 41.3, -72.9, [], log=quiet)
+    assert cache.stats()["misses"] == misses + 1
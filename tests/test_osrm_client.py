@@ -0,0 +1,92 @@
+"""
+OSRMClient against the local OSRM stub: circuit breaker, failover, and
+latency under concurrency when the preferred endpoint is slow.
+"""
+import time
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.benchmark.stubs import osrm_stub, running
+from src.osrm_client import OSRMClient, OSRMUnavailable
+
+ROUTE = "/route/v1/driving/-72.9,41.3;-72.8,41.4?overview=false"
+
+
+def endpoint(client, i):
+    return client.stats()["endpoints"][i]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# -------------------------------------------------------------
+def test_breaker_trips_and_fails_over():
+    with running(osrm_stub(fail=True)) as bad, running(osrm_stub()) as good:
+        client = OSRMClient([bad, good], failure_threshold=3, reset_after_s=60)
+        for _ in range(10):
+            assert client.get(ROUTE)["code"] == "Ok"
+        failing, healthy = endpoint(client, 0), endpoint(client, 1)
+        assert failing["state"] == "open" and failing["trips"] == 1
+        assert failing["requests"] == 3          # skipped once the breaker opened
+        assert healthy["wins"] == 10
+
+
+def test_dead_endpoint_fails_over():
+    with running(osrm_stub()) as good:
+        client = OSRMClient([f"http://127.0.0.1:{free_port()}", good])
+        assert client.get(ROUTE)["code"] == "Ok"
+        assert endpoint(client, 0)["failures"] == 1
+        assert endpoint(client, 1)["wins"] == 1
+
+
+def test_fails_fast_when_every_breaker_is_open():
+    with running(osrm_stub(fail=True)) as bad:
+        client = OSRMClient([bad], failure_threshold=2, reset_after_s=60)
+        for _ in range(2):
+            with pytest.raises(OSRMUnavailable, match="503"):
+                client.get(ROUTE)
+        start = time.monotonic()
+        with pytest.raises(OSRMUnavailable, match="circuit breaker is open"):
+            client.get(ROUTE)
+        assert time.monotonic() - start < 0.05
+
+
+def test_slow_primary_keeps_p95_bounded():
+    # 16 callers, 3 s primary, instant secondary: hedges must not queue behind
+    # the abandoned primary attempts, and the primary must be demoted
+    with running(osrm_stub(delay_s=3.0)) as slow, running(osrm_stub()) as fast:
+        client = OSRMClient([slow, fast])
+
+        def timed_get(_):
+            start = time.monotonic()
+            assert client.get(ROUTE)["code"] == "Ok"
+            return time.monotonic() - start
+
+        with ThreadPoolExecutor(16) as callers:
+            latencies = np.asarray(list(callers.map(timed_get, range(800))))
+
+        assert np.percentile(latencies, 95) < 0.5
+        assert endpoint(client, 0)["demoted"]
+        assert endpoint(client, 1)["wins"] == 800
+
+
+def test_demoted_endpoint_is_tried_first_again():
+    with running(osrm_stub(delay_s=0.3)) as slow, running(osrm_stub()) as fast:
+        client = OSRMClient([slow, fast], min_samples=5, hedge_default_s=0.05, demote_window_s=1.0)
+        for _ in range(30):
+            client.get(ROUTE)
+        time.sleep(0.4)                          # let the last slow attempts finish
+        client.get(ROUTE)
+        assert endpoint(client, 0)["demoted"]
+        requests = endpoint(client, 0)["requests"]
+
+        time.sleep(1.0)                          # slow samples age out of the window
+        client.get(ROUTE)
+        assert not endpoint(client, 0)["demoted"]
+        assert endpoint(client, 0)["requests"] == requests + 1
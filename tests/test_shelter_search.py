@@ -0,0 +1,256 @@
+"""
+Nearest-shelter search over the synthetic CT dataset: eager, partitioned and
+legacy-partitioned (tiles without stored filter bits) agents must return the
+same shelters as a brute-force scan, for every query/filter/state combination.
+
+Two copies of the data are used: "ct" as generated, and "ct_west" whose flood
+layer only maps the western part of the state, so some shelters and query
+points lie outside every flood layer.
+"""
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+import shapely
+
+from src.benchmark import synthetic
+from src.data_agent.data_agent import DataAgent
+from src.data_agent.exposure import COVERAGE_DEG, RISK_ORDER
+from src.data_agent.filters import FILTER_BITS, NO_PET_VALUES, YES_VALUES
+from src.data_agent.partitions import INDEX_FILE, build_partitions
+from src.data_agent.spatial import geodesic_miles
+
+WEST_OF = -72.8          # ct_west keeps flood polygons west of this longitude
+LIMIT = 5
+
+FILTERS = [
+    [],
+    ["flood_safe"],
+    ["accessible", "pets"],
+    ["open", "flood_safe"],
+    ["generator", "open", "pets", "flood_safe"],
+]
+STATES = [None, "CT", "RI"]
+
+
+def flood_path(base):
+    return os.path.join(base, "hazards", "floods", "CT_Flood_Zones.shp")
+
+
+def legacy_partitions(src, dst):
+    """Copy of a partition directory as built before filter bitmaps were stored."""
+    shutil.copytree(src, dst)
+    index_path = os.path.join(dst, INDEX_FILE)
+    with open(index_path) as f:
+        index = json.load(f)
+    index.pop("shelter_tile_bits")
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+    for name in index["shelter_tiles"]:
+        path = os.path.join(dst, "shelters", f"{name}.pkl")
+        pd.read_pickle(path).drop(columns="filter_bits").to_pickle(path)
+
+
+@pytest.fixture(scope="session")
+def datasets(tmp_path_factory):
+    root = tmp_path_factory.mktemp("synthetic")
+    base = str(root / "ct")
+    synthetic.generate("ct", base, seed=0)
+
+    west = str(root / "ct_west")
+    shutil.copytree(base, west)
+    floods = gpd.read_file(flood_path(west))
+    floods[floods.geometry.bounds["maxx"] < WEST_OF].to_file(flood_path(west))
+
+    agents = {}
+    for name, path in (("ct", base), ("ct_west", west)):
+        eager = DataAgent(base_path=path, partitions=False)
+        build_partitions(eager, os.path.join(path, "partitions"))
+        legacy_partitions(os.path.join(path, "partitions"), os.path.join(path, "legacy"))
+        floods = gpd.read_file(flood_path(path)).to_crs("EPSG:4326")
+        agents[name] = {
+            "eager": eager,
+            "partitioned": DataAgent(base_path=path, partitions=os.path.join(path, "partitions")),
+            "legacy": DataAgent(base_path=path, partitions=os.path.join(path, "legacy")),
+            "floods": floods,
+            "shelter_risks": shelter_risks(eager.df, floods),
+        }
+    return agents
+
+
+# -------------------------------------------------------------
+def mapped(floods, lats, lons):
+    """Brute force: the point's coverage cell meets some flood polygon's bounding box."""
+    b = floods.geometry.bounds.to_numpy() / COVERAGE_DEG
+    rows = np.floor(np.asarray(lats) / COVERAGE_DEG)[:, None]
+    cols = np.floor(np.asarray(lons) / COVERAGE_DEG)[:, None]
+    return (
+        (np.floor(b[:, 1]) <= rows) & (rows <= np.floor(b[:, 3]))
+        & (np.floor(b[:, 0]) <= cols) & (cols <= np.floor(b[:, 2]))
+    ).any(axis=1)
+
+
+def shelter_risks(df, floods):
+    """Brute force: risk classes of every flood polygon containing each shelter."""
+    risk = [
+        DataAgent.classify_flood_risk(z, s, f)
+        for z, s, f in zip(floods["FLD_ZONE"], floods["ZONE_SUBTY"], floods["SFHA_TF"])
+    ]
+    geoms = floods.geometry.values
+    return [
+        [risk[i] for i in np.flatnonzero(shapely.intersects(geoms, point))]
+        for point in df.geometry.values
+    ]
+
+
+def brute_force(data, lat, lon, filters, state):
+    """(applied filters, unavailable filters, [(name, city, miles)]) by scanning every shelter."""
+    df, floods = data["eager"].df, data["floods"]
+    filters = list(filters)
+    unavailable = []
+    if "flood_safe" in filters and not mapped(floods, [lat], [lon])[0]:
+        filters.remove("flood_safe")
+        unavailable = ["flood_safe"]
+
+    def upper(column):
+        return df[column].fillna("").astype(str).str.strip().str.upper()
+
+    keep = pd.Series(True, index=df.index)
+    if "accessible" in filters:
+        keep &= upper("handicap_accessible").eq("YES")
+    if "pets" in filters:
+        keep &= ~upper("pet_accomm").isin(NO_PET_VALUES)
+    if "generator" in filters:
+        keep &= upper("generator_").isin(YES_VALUES)
+    if "open" in filters:
+        keep &= upper("shelter_st").eq("OPEN")
+    if "flood_safe" in filters:
+        lats, lons = df.geometry.y.to_numpy(), df.geometry.x.to_numpy()
+        high = np.asarray(["High" in risks for risks in data["shelter_risks"]], dtype=bool)
+        keep &= mapped(floods, lats, lons) & ~high
+    if state:
+        keep &= upper("state").eq(state.upper())
+
+    rows = df[keep.to_numpy()].copy()
+    rows["miles"] = geodesic_miles(lat, lon, rows.geometry.y.to_numpy(), rows.geometry.x.to_numpy())
+    rows = rows.sort_values("miles")
+    rows = rows.drop_duplicates(["shelter_na", "city", "state"]).head(LIMIT)
+    found = [(n.title(), c, round(m, 2)) for n, c, m in zip(rows["shelter_na"], rows["city"], rows["miles"])]
+    return sorted(filters, key=list(FILTER_BITS).index), unavailable, found
+
+
+def summary(result):
+    return [(s["name"], s["city"], s["straightline_distance_miles"]) for s in result["nearest_shelters"]]
+
+
+def query_points():
+    points = synthetic.query_points("ct", 12, seed=2)
+    return points + [(41.05, -71.80), (41.5, -73.7), (31.0, -100.0)]    # edges of CT, and far outside it
+
+
+# -------------------------------------------------------------
+@pytest.mark.parametrize("dataset", ["ct", "ct_west"])
+@pytest.mark.parametrize("mode", ["eager", "partitioned", "legacy"])
+def test_matches_brute_force(datasets, dataset, mode):
+    agent = datasets[dataset][mode]
+    for lat, lon in query_points():
+        for filters in FILTERS:
+            for state in STATES:
+                applied, unavailable, expected = brute_force(datasets[dataset], lat, lon, filters, state)
+                result = agent.get_nearest_shelters(lat, lon, limit=LIMIT, state_filter=state, filters=filters)
+                where = f"{mode} {dataset} at {(lat, lon)} filters={filters} state={state}"
+                assert result["filters"] == applied, where
+                assert result.get("unavailable_filters", []) == unavailable, where
+                assert summary(result) == expected, where
+
+
+def test_flood_safe_only_where_mapped(datasets):
+    data = datasets["ct_west"]
+    east = (41.6, -72.0)
+    assert not mapped(data["floods"], [east[0]], [east[1]])[0]
+    for mode in ("eager", "partitioned", "legacy"):
+        agent = data[mode]
+        # unmapped origin: the filter is reported, not silently treated as satisfied
+        result = agent.get_nearest_shelters(*east, limit=LIMIT, filters=["flood_safe"])
+        assert result["filters"] == []
+        assert result["unavailable_filters"] == ["flood_safe"]
+        assert summary(result) == summary(agent.get_nearest_shelters(*east, limit=LIMIT))
+
+        # mapped origin: every shelter returned lies in the mapped area
+        result = agent.get_nearest_shelters(41.5, -73.3, limit=20, filters=["flood_safe"])
+        assert result["filters"] == ["flood_safe"]
+        lats = [s["lat"] for s in result["nearest_shelters"]]
+        lons = [s["lon"] for s in result["nearest_shelters"]]
+        assert len(lats) == 20 and mapped(data["floods"], lats, lons).all()
+
+
+def test_flood_safe_without_flood_layer(datasets, tmp_path):
+    base = str(tmp_path / "no_hazards")
+    shutil.copytree(datasets["ct"]["eager"].base_path, base, ignore=shutil.ignore_patterns("hazards", "partitions", "legacy"))
+    agent = DataAgent(base_path=base, partitions=False)
+    result = agent.get_nearest_shelters(41.5, -72.7, limit=LIMIT, filters=["open", "flood_safe"])
+    assert result["filters"] == ["open"]
+    assert result["unavailable_filters"] == ["flood_safe"]
+    assert summary(result) == summary(agent.get_nearest_shelters(41.5, -72.7, limit=LIMIT, filters=["open"]))
+
+
+@pytest.mark.parametrize("mode", ["eager", "partitioned"])
+def test_shelter_zone_is_highest_class(datasets, mode):
+    data = datasets["ct"]
+    agent = data[mode]
+    df = data["eager"].df
+    checked = 0
+    for lon, lat, risks in zip(df.geometry.x, df.geometry.y, data["shelter_risks"]):
+        if len(set(risks)) < 2:
+            continue
+        shelter = agent.get_nearest_shelters(lat, lon, limit=1)["nearest_shelters"][0]
+        assert (shelter["lat"], shelter["lon"]) == (lat, lon)
+        reported = [h["risk"] for h in shelter["hazard_polygons"] if h["type"] == "fema_flood"]
+        assert reported == [min(risks, key=RISK_ORDER.index)]
+        checked += 1
+    assert checked > 0     # the dataset must contain shelters in overlapping zones of different classes
+
+
+@pytest.mark.parametrize("kind", ["partitions", "legacy"])
+def test_memory_budget_covers_derived_data(datasets, kind):
+    base = datasets["ct"]["eager"].base_path
+    agent = DataAgent(base_path=base, partitions=os.path.join(base, kind), memory_budget_mb=1)
+    store = agent.partitions
+    seen = set()
+    for lat, lon in synthetic.query_points("ct", 20, seed=4):
+        for run in (
+            lambda: agent.get_nearest_shelters(lat, lon, limit=LIMIT, filters=["open", "flood_safe"]),
+            lambda: agent.route_flood_exposure([(lat, lon), (lat + 0.6, lon + 1.2)]),    # spans several tiles
+        ):
+            run()
+            seen |= {key[0] for key in store._cache}
+            # every cached tile, hazard index and bitmap is accounted for and within budget
+            assert store.bytes == sum(size for _, size in store._cache.values())
+            assert store.bytes <= store.budget_bytes or len(store._cache) == 1
+    assert "hazard_index" in seen
+    assert ("filter_bits" in seen) == (kind == "legacy")
+    assert store.evictions > 0
+    # tiles are left as loaded, not grown behind the store's back
+    assert all(
+        "filter_bits" not in frame.columns
+        for key, (frame, _) in store._cache.items() if key[0] == "shelters" and kind == "legacy"
+    )
+
+
+def test_rows_without_coordinates_are_skipped(datasets):
+    base = datasets["ct"]["eager"].base_path
+    agent = DataAgent(base_path=base, partitions=False)
+    broken = agent.df.head(3).copy()
+    broken["shelter_na"] = broken["shelter_na"] + " annex"
+    broken["geometry"] = [shapely.Point(np.nan, np.nan), None, shapely.Point(-72.9, np.inf)]
+    agent.df = gpd.GeoDataFrame(pd.concat([broken, agent.df], ignore_index=True), crs=agent.df.crs)
+
+    reference = datasets["ct"]["eager"]
+    for lat, lon in query_points():
+        for filters in FILTERS:
+            result = agent.get_nearest_shelters(lat, lon, limit=LIMIT, filters=filters)
+            assert summary(result) == summary(reference.get_nearest_shelters(lat, lon, limit=LIMIT, filters=filters))